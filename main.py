@@ -1,22 +1,28 @@
 import json
+import os
 import shutil
 import sys
 import datetime
 import subprocess
+import time
 from pathlib import Path
 from typing import Optional, Tuple
 
-from modules.capture import capture_fswebcam
+# Nachts braucht ein Lauf nur OWM, Storm-Tick und JSON: Module mit Pillow & Co.
+# (capture, scenechange, rainintensity, rainrate, nowcast, classify, upload) werden
+# erst in den Tages-Stufen importiert. Überwacht von `python3 -m modules.coldstart`.
 from modules import openweathermap
-from modules import classify
+from modules import scheduler
+from modules import sites
+from modules import persist
+from modules import daylight
+from modules.deadline import Deadline, run_group
 from modules.stormwarning import tick
-from modules.rainintensity import generate, DEFAULT_TILES
-from modules.upload import upload
 
 
 # ---------- Daylight-Gate ----------
 
-def daylight_ok(cfg: dict, script_00_path: Path) -> bool:
+def daylight_ok(cfg: dict, script_00_path: Path, deadline: Optional[Deadline] = None) -> bool:
     """
     True  -> Tageslicht: Kamera erlaubt
     False -> Nacht      : Kamera gesperrt (aber JSON soll trotzdem erzeugt werden)
@@ -24,14 +30,23 @@ def daylight_ok(cfg: dict, script_00_path: Path) -> bool:
     if not cfg.get("daylight_gate", True):
         return True
 
+    # Ohne Subprozess über die Sonnenhöhe (Standort aus Config oder Gate-Skript)
+    is_day = daylight.is_daylight(cfg, script_00_path)
+    if is_day is not None:
+        if not is_day:
+            print("🌙 Daylight-Gate: Nacht (Sonnenhöhe)")
+        return is_day
+
     if script_00_path.exists():
         try:
-            res = subprocess.run(
+            res = run_group(
                 ["bash", str(script_00_path)],
+                env={**os.environ, **daylight.script_env(cfg)},
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
                 check=False,
+                timeout=deadline.timeout(10) if deadline else None,
             )
             if res.returncode == 0:
                 return True
@@ -50,14 +65,23 @@ def run_camera_pipeline(
     base: Path,
     cfg: dict,
     script_02_path: Path,
-) -> Tuple[Optional[Path], Optional[Path]]:
+    deadline: Optional[Deadline] = None,
+) -> Tuple[Optional[Path], Optional[Path], Optional[dict], Optional[int], Optional[dict]]:
     """
     Kamera-/Bild-Workflow (nur tagsüber aufgerufen).
     Returns:
-        (old_path, fixed_path) bei Erfolg
-        (None, None) wenn keine Aufnahme
+        (old_path, fixed_path, scene, radar_epoch, capture) bei Erfolg
+        (None, fixed_path, scene, None, capture) wenn unverändert und nur Referenz gespeichert wird –
+            fixed_path ist dann das wiederhergestellte vorige Live-Bild (None ohne Referenz)
+        (None, None, None, None, capture) wenn keine Aufnahme
+    capture: Backend, Dauer, Frames und Schärfemaß der Aufnahme
     """
-    current_dir = base / "jpg" / "current"
+    from modules.capture import get_backend
+    from modules import scenechange
+    from modules.rainintensity import generate, DEFAULT_TILES
+
+    # Flüchtige Dateien (Aufnahme, Live-Bild, Radar-JPG) bei aktivem Staging im RAM
+    current_dir = sites.current_dir(base, cfg)
     old_dir     = base / "jpg" / "old"
     cache_dir   = base / "jpg" / "cache"
 
@@ -65,22 +89,62 @@ def run_camera_pipeline(
     old_dir.mkdir(parents=True, exist_ok=True)
     cache_dir.mkdir(parents=True, exist_ok=True)
 
-    fixed_path          = current_dir / "IMG_4903.jpg"
-    radar_out_path      = current_dir / "radar_Nuremberg_zoom6.jpg"
+    tiles = [tuple(t) for t in cfg.get("tiles", DEFAULT_TILES)]
+    zoom = int(cfg.get("zoom", 6))
+    center = tuple(cfg["center"]) if cfg.get("center") else None
+    viewport = tuple(cfg["viewport"]) if cfg.get("viewport") else None
+    bbox = tuple(cfg["bbox"]) if cfg.get("bbox") else None
+    # Breite des Insets; Höhe ohne Angabe aus dem Seitenverhältnis des Panels (passt zu viewport)
+    overlay_size = tuple(cfg.get("overlay_size") or (400, None))
+
+    fixed_path          = current_dir / cfg.get("local_file", "IMG_4903.jpg")
+    radar_out_path      = current_dir / cfg.get("radar_file", "radar_Nuremberg_zoom6.jpg")
     radar_cache_path    = cache_dir / "radar_last.png"
     basemap_cache_path  = cache_dir / "basemap.png"
 
-    # 1) Bild aufnehmen
-    img_path = capture_fswebcam(script_02_path)
+    # Aufnahmeziel & Gerät je Standort an das Capture-Skript durchreichen (Backend "fswebcam")
+    env = os.environ.copy()
+    env["CURRENT_DIR"] = str(current_dir)
+    if cfg.get("video_device"):
+        env["VIDEO_DEVICE"] = str(cfg["video_device"])
+    # Standort für das Daylight-Gate im Skript, sonst gelten dort feste Koordinaten
+    env.update(daylight.script_env(cfg))
+
+    # 1) Bild aufnehmen (Backend laut cfg["capture"]["backend"])
+    try:
+        backend = get_backend(cfg, Path(cfg.get("capture_script", script_02_path)), env=env)
+        img_path = backend.capture(current_dir, timeout=deadline.timeout(120) if deadline else None)
+    except (RuntimeError, OSError) as e:
+        # Skript-Fehler, fehlendes Bild, Gerät weg: ohne Bild weiter – das JSON wird trotzdem geschrieben
+        print(f"⚠️ Aufnahme fehlgeschlagen: {e}")
+        if deadline is not None:
+            deadline.degrade("capture", f"failed ({type(e).__name__})")
+        return None, None, None, None, None
+    capture = backend.last_info or None
 
     if img_path is None or not img_path.exists():
         print("⚠️ Keine Bildaufnahme – überspringe Kamera-Workflow.")
-        return None, None
+        return None, None, None, None, capture
 
     print("➡️ img_path:", img_path)
 
-    # 2) Original nach jpg/old/ verschieben
     old_path = old_dir / img_path.name
+
+    # 1b) Szenenwechsel prüfen (vor dem Radar-Overlay, das sich jedes Mal ändert)
+    scene = scenechange.check(cfg, img_path, reference_path=old_path)
+    if scene["reference_only"]:
+        # Unverändert: keine Archivkopie, nur Verweis auf das Referenzbild im JSON
+        img_path.unlink(missing_ok=True)
+        print("🔁 Szene unverändert – nur Referenz auf:", scene["reference_path"])
+        # Das Capture-Skript hat current/ geleert: voriges Live-Bild (Archivkopie inkl.
+        # Radar) wiederherstellen statt auf ein Rohbild zu zeigen
+        ref = Path(scene["reference_path"]) if scene.get("reference_path") else None
+        if ref is None or not ref.exists():
+            return None, None, scene, None, capture
+        shutil.copy2(ref, fixed_path)
+        return None, fixed_path, scene, None, capture
+
+    # 2) Original nach jpg/old/ verschieben
     shutil.move(str(img_path), str(old_path))
     print("📸 Bild verschoben nach:", old_path)
 
@@ -88,45 +152,69 @@ def run_camera_pipeline(
     shutil.copy2(old_path, fixed_path)
 
     # 4) Radar EINMAL rendern & Overlay auf IMG_4903.jpg
-    generate(
-        cfg,
-        output_image_path=radar_out_path,
-        bg_image_path=fixed_path,
-        radar_image_cache_path=radar_cache_path,
-        basemap_image_cache_path=basemap_cache_path,
-        tiles=DEFAULT_TILES,
-        zoom=6,
-        legend=True,
-        legend_width=54,
-        overlay_size=(400, 322),
-        margin_right=90,
-        margin_bottom=135,
-        crop_bottom=100,
-        opacity=0.85,
-        border=True,
-        border_width=4,
-        border_color="#808080",
-    )
+    render = cfg.get("render", {})
+    try:
+        radar_epoch = generate(
+            cfg,
+            output_image_path=radar_out_path,
+            bg_image_path=fixed_path,
+            radar_image_cache_path=radar_cache_path,
+            basemap_image_cache_path=basemap_cache_path,
+            tiles=tiles,
+            zoom=zoom,
+            center=center,
+            viewport=viewport,
+            bbox=bbox,
+            legend=True,
+            legend_width=54,
+            overlay_size=overlay_size,
+            margin_right=90,
+            margin_bottom=135,
+            crop_bottom=100,
+            opacity=0.85,
+            border=True,
+            border_width=4,
+            border_color="#808080",
+            low_memory=bool(render.get("low_memory", False)),
+            max_rss_mb=render.get("max_rss_mb"),
+            deadline=deadline,
+        )
+    except (MemoryError, TimeoutError, OSError, ValueError) as e:
+        # Budget überschritten oder Netz/Datei weg (requests.RequestException ist ein OSError),
+        # ValueError: Ausschnitt ungültig (z. B. viewport über den Kartenrand) – Config-Fehler.
+        # Bild ohne Radar behalten statt den Lauf abzubrechen – das JSON wird immer geschrieben
+        print(f"⚠️ Radar-Rendering abgebrochen: {e}")
+        if deadline is not None:
+            deadline.degrade("radar", "skipped" if isinstance(e, TimeoutError) else f"skipped ({type(e).__name__})")
+        radar_epoch = None
 
     # 5) Overlay in die Originaldatei übernehmen
     shutil.copy2(fixed_path, old_path)
 
-    return old_path, fixed_path
+    return old_path, fixed_path, scene, radar_epoch, capture
 
 
-# ---------- main ----------
+# ---------- Standort-Lauf ----------
 
-def main():
-    base = Path(__file__).parent
+def run_site(base: Path, cfg: dict, scripts_dir: Path, is_daylight: Optional[bool] = None,
+             start: Optional[float] = None) -> Optional[Path]:
+    """
+    Ein kompletter Zyklus für einen Standort; alle Ausgaben und Zustände unter base.
+    is_daylight: None → Tag/Nacht aus der Standort-Config (eigene Koordinaten je Standort).
+    start: monotone Startzeit des Zyklus – das Zeitbudget (cfg["deadline"]) zählt ab dort.
+    Returns: Pfad des geschriebenen JSON, None wenn der Lauf laut Scheduler nicht fällig ist.
+    """
+    deadline = Deadline.from_cfg(cfg, start=start)
 
-    # Konfiguration laden
-    cfg_path = base / "config.local.json"
-    with open(cfg_path, "r", encoding="utf-8") as f:
-        cfg = json.load(f)
+    # Adaptiver Takt: Cron läuft mit min_interval, nicht fällige Läufe enden hier
+    if not scheduler.due(cfg):
+        print(f"⏳ Scheduler [{cfg.get('name', 'default')}]: nächster Lauf noch nicht fällig.")
+        return None
+
+    # Tag/Nacht je Standort (Sonnenhöhe an dessen Koordinaten)
+    if is_daylight is None:
+        is_daylight = daylight_ok(cfg, scripts_dir / "00_daylight_gate.sh", deadline=deadline)
 
-    # Skriptpfade
-    scripts_dir    = base / "modules"
-    script_00_path = scripts_dir / "00_daylight_gate.sh"  # optional
     script_02_path = scripts_dir / "02_take_webcam_picture.sh"
 
     # Verzeichnisse
@@ -135,35 +223,66 @@ def main():
     json_dir.mkdir(parents=True, exist_ok=True)
     classified_base_dir.mkdir(parents=True, exist_ok=True)
 
-    # Tag/Nacht prüfen
-    is_daylight = daylight_ok(cfg, script_00_path)
-
     old_path: Optional[Path] = None
     fixed_path: Optional[Path] = None
     classification = None
     classification_detail = None
+    scene = None
+    radar_epoch = None
+    rain = None
+    outlook = None
+    capture = None
 
     if is_daylight:
         # --- Tagsüber: Kamera & Klassifizierung ---
-        old_path, fixed_path = run_camera_pipeline(base, cfg, script_02_path)
-
-        if fixed_path and fixed_path.exists():
-            upload(cfg, fixed_path)
-            print("➡️ Upload:", fixed_path)
+        from modules import classify, nowcast, rainrate
+        from modules.upload import upload
+
+        old_path, fixed_path, scene, radar_epoch, capture = run_camera_pipeline(
+            base, cfg, script_02_path, deadline=deadline
+        )
+
+        if scene is not None and not scene["changed"]:
+            print("⏭️ Upload übersprungen (Szene unverändert)")
+        elif fixed_path and fixed_path.exists():
+            if not deadline.allows("upload"):
+                deadline.degrade("upload", "skipped")
+            else:
+                try:
+                    upload(cfg, fixed_path, timeout=deadline.timeout(60))
+                    print("➡️ Upload:", fixed_path)
+                except subprocess.TimeoutExpired:
+                    deadline.degrade("upload", "timeout")
+                except subprocess.CalledProcessError as e:
+                    # z. B. sftp-ConnectTimeout (exit 255) – Lauf geht weiter
+                    deadline.degrade("upload", f"failed (exit {e.returncode})")
+                except OSError as e:
+                    deadline.degrade("upload", f"failed ({type(e).__name__})")
 
         # Klassifizierung nur tagsüber
-        owm = openweathermap.get_openweathermap(cfg)
-        classification, classification_detail = classify.classify_weather(owm)
-        storm = tick(cfg, owm)
+        owm = openweathermap.get_openweathermap(cfg, deadline=deadline)
+        coord = owm.get("coord") or {}
+        owm_location = (coord["lat"], coord["lon"]) if "lat" in coord and "lon" in coord else None
+        rain = rainrate.measure(cfg, base / "jpg" / "cache" / "radar_last.png", owm_location)
+        if deadline.allows("nowcast"):
+            outlook = nowcast.forecast(cfg, base / "jpg" / "cache" / "radar_last.png", owm_location)
+        else:
+            deadline.degrade("nowcast", "skipped")
+        classification, classification_detail = classify.classify_weather(owm, rain)
+        storm = tick(cfg, owm, deadline=deadline)
     else:
         # --- Nacht: nur Wetterdaten, keine Bilder, keine Klassifizierung ---
         print("🌙 Nachtmodus: kein Bild, keine Klassifizierung – nur Wetterdaten.")
-        owm = openweathermap.get_openweathermap(cfg)
-        storm = tick(cfg, owm)
+        owm = openweathermap.get_openweathermap(cfg, deadline=deadline)
+        storm = tick(cfg, owm, deadline=deadline)
+
+    # Nächstes Intervall anhand der Wetterdynamik festlegen
+    schedule = scheduler.plan(cfg, storm=storm, owm=owm, radar_epoch=radar_epoch, scene=scene)
 
     # ==== JSON immer speichern ====
     weather_data = {
         "timestamp": datetime.datetime.now().isoformat(),
+        "site": cfg.get("name"),
         "is_daylight": is_daylight,
         "old_path": str(old_path) if old_path else None,
         "current_img_path": str(fixed_path) if fixed_path else None,
@@ -171,6 +290,14 @@ def main():
         "classification": classification,
         "classification_detail": classification_detail,
         "stormwarning": storm,
+        "scene": scene,
+        "radar_epoch": radar_epoch,
+        "capture": capture,
+        "rain": rain,
+        "nowcast": outlook,
+        "schedule": schedule,
+        "degraded": deadline.degraded,
+        "cycle_seconds": round(time.monotonic() - deadline.start, 1),
     }
 
     if old_path:
@@ -179,16 +306,72 @@ def main():
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         json_path = json_dir / f"{ts}.json"
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(weather_data, f, indent=4, ensure_ascii=False)
+    persist.write_durable(json_path, json.dumps(weather_data, indent=4, ensure_ascii=False).encode("utf-8"))
 
     print(f"✅ JSON gespeichert: {json_path}")
 
+    # Letztes JSON zusätzlich neben das Live-Bild (für den lokalen HTTP-Server)
+    latest_dir = sites.current_dir(base, cfg)
+    latest_dir.mkdir(parents=True, exist_ok=True)
+    persist.write_transient(latest_dir / "latest.json", json.dumps(weather_data, ensure_ascii=False).encode("utf-8"))
+
     # copy_to_classified nur tagsüber (wenn ein Bild da ist)
     if is_daylight and old_path:
+        from modules import classify
         classify.copy_to_classified(weather_data, old_path, json_path, classified_base_dir)
 
+    return json_path
 
-if __name__ == "__main__":
-    main()
 
+# ---------- main ----------
+
+def main(loop: bool = False):
+    """
+    Ein Zyklus für alle Standorte (Cron). loop: Prozess bleibt resident und startet den
+    nächsten Zyklus, sobald der Scheduler ihn fällig meldet (ohne Scheduler alle
+    loop_interval Sekunden) – Geräte-Backends und Caches bleiben dabei offen.
+    """
+    base = Path(__file__).parent
+
+    # Konfiguration laden
+    cfg_path = base / "config.local.json"
+    with open(cfg_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    # SD-Karten-Schonung: Staging einrichten, Reste eines abgebrochenen Flushs aufräumen
+    persist.configure(cfg)
+    persist.recover()
+
+    # Skriptpfade (Tag/Nacht prüft jeder Standort selbst in run_site)
+    scripts_dir = base / "modules"
+
+    # Standorte: ohne "sites" genau einer im Projektverzeichnis; sonst parallel,
+    # mit geteiltem Tile-Cache und gruppierten OWM-Abfragen
+    site_list = sites.site_configs(base, cfg)
+    try:
+        while True:
+            start = time.monotonic()
+            sites.run_sites(
+                site_list,
+                lambda site_base, site_cfg: run_site(site_base, site_cfg, scripts_dir, start=start),
+                max_workers=int(cfg.get("max_workers", 2)),
+            )
+
+            # Gestagte Dateien gebündelt & atomar auf die Karte (nur wenn flush_interval abgelaufen)
+            persist.flush()
+            if not loop:
+                break
+
+            # Nächster fälliger Standort; Standorte ohne Scheduler alle loop_interval Sekunden
+            fixed = float(cfg.get("loop_interval", 300))
+            waits = [scheduler.seconds_until_due(site_cfg) for _, _, site_cfg in site_list]
+            wait = min(fixed if w is None else w for w in waits)
+            # Mindestens eine Sekunde, damit ein knapp verfehlter Termin nicht im Kreis läuft
+            time.sleep(max(1.0, wait))
+    finally:
+        if loop:
+            persist.flush(force=True)
+
+
+if __name__ == "__main__":
+    main(loop="--loop" in sys.argv[1:])
@@ -1,8 +1,9 @@
 #!/bin/bash
 set -euo pipefail
 
-LAT="49.454N"
-LON="11.078E"
+# Standort je Site von main.py (Umgebung), sonst Standardkoordinaten
+LAT="${LAT:-49.454N}"
+LON="${LON:-11.078E}"
 
 # Zeiten für zivile Dämmerung holen (Format: HH:MM,HH:MM)
 OUT=$(sunwait list civil "$LAT" "$LON")
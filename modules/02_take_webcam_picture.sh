@@ -3,7 +3,8 @@ set -euo pipefail
 
 # Verzeichnis relativ zum Skript
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-CURRENT_DIR="${SCRIPT_DIR}/../jpg/current"
+CURRENT_DIR="${CURRENT_DIR:-${SCRIPT_DIR}/../jpg/current}"
+VIDEO_DEVICE="${VIDEO_DEVICE:-/dev/video0}"
 
 # --- 0) Daylight-Gate aufrufen ---
 GATE_OUT=$("$SCRIPT_DIR/00_daylight_gate.sh" 2>&1)
@@ -33,7 +34,7 @@ OUT_IMG="$CURRENT_DIR/IMG_4903_${TS}.jpg"
 LIVE_IMG="$CURRENT_DIR/IMG_4903.jpg"
 
 # Bild aufnehmen
-fswebcam --flip v --flip h --skip 10 -r 1920x1080 --no-banner \
+fswebcam -d "$VIDEO_DEVICE" --flip v --flip h --skip 10 -r 1920x1080 --no-banner \
   --input 0 --jpeg 95 --palette MJPEG "$OUT_IMG"
 
 # Maße
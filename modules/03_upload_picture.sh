@@ -4,6 +4,7 @@ REMOTE_FILE="$2"
 LOCAL_FILE="$3"
 
 sshpass -p "${PASSWORD}" sftp -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null \
+  -o ConnectTimeout="${CONNECT_TIMEOUT:-10}" -o ServerAliveInterval=5 -o ServerAliveCountMax=2 \
   "${REMOTE_USER}@${REMOTE_HOST}" <<EOF
 cd ${REMOTE_PATH}
 rm ${REMOTE_FILE}
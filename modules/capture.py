@@ -1,13 +1,34 @@
+from abc import ABC, abstractmethod
 from pathlib import Path
 import subprocess
+import atexit
+import collections
+import datetime
+import itertools
+import random
+import threading
+import time
+from typing import Optional, List, Dict, Any
 
-def capture_fswebcam(script_path: Path = Path("./02_take_webcam_picture.sh")) -> Path | None:
-    result = subprocess.run(
-        [str(script_path)],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageStat
+
+from modules.deadline import run_group
+
+
+def capture_fswebcam(script_path: Path = Path("./02_take_webcam_picture.sh"),
+                     env: dict | None = None, timeout: float | None = None) -> Path | None:
+    try:
+        result = run_group(
+            [str(script_path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+            timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        # Zeitbudget aufgebraucht → wie "keine Aufnahme" behandeln
+        return None
 
     if result.returncode == 3:
         # Nacht/Skip
@@ -28,3 +49,332 @@ def capture_fswebcam(script_path: Path = Path("./02_take_webcam_picture.sh")) ->
         raise FileNotFoundError(f"Ausgegebenes Bild existiert nicht: {image_path}")
 
     return image_path
+
+
+# ============================ Capture-Backends ============================
+# Einheitliche Schnittstelle: backend.capture(out_dir, timeout) → Pfad eines JPEGs
+# (wie bisher das Skript) oder None. Auswahl über cfg["capture"]["backend"]:
+#   "fswebcam" – bisheriges Skript 02_take_webcam_picture.sh (Standard)
+#   "device"   – Gerät bleibt offen (OpenCV), Ringpuffer, schärfstes Bild gewinnt
+#   "file"     – Datei, Verzeichnis oder "synthetic" (Tests/Entwicklung ohne Kamera)
+
+# V4L2 hält typischerweise 4 Puffer; nach einer Lesepause sind diese veraltet
+_STALE_BUFFERS = 4
+
+_LAPLACE = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+
+
+def focus_measure(img: Image.Image, size: int = 320) -> float:
+    """Varianz des Laplace-gefilterten Graubilds (verkleinert) – höher = schärfer. Komplett in C."""
+    gray = img.convert("L")
+    gray.thumbnail((size, size))
+    return ImageStat.Stat(gray.filter(_LAPLACE)).var[0]
+
+
+def _postprocess(img: Image.Image, text: str) -> Image.Image:
+    """
+    Pillow-Pendant zum ImageMagick-Teil des Skripts: nach unten zunehmende
+    Unschärfe (Privatsphäre der Nachbarn) und Text unten rechts.
+    """
+    lightly = img.filter(ImageFilter.GaussianBlur(2))
+    fully = img.filter(ImageFilter.GaussianBlur(25))
+    h = img.height
+    mask = Image.linear_gradient("L").resize((1, h)).point(lambda v: int(255 * (v / 255) ** 0.5))
+    out = Image.composite(fully, lightly, mask.resize(img.size))
+    draw = ImageDraw.Draw(out)
+    try:
+        font = ImageFont.load_default()
+    except Exception:
+        font = None
+    _, _, tw, th = draw.textbbox((0, 0), text, font=font)
+    draw.text((out.width - tw - 75, out.height - th - 90), text, font=font, fill="white")
+    return out
+
+
+def _cpu_temp() -> str:
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp", "r", encoding="ascii") as f:
+            return f"{int(f.read().strip()) / 1000:.0f}°C"
+    except Exception:
+        return "n/a"
+
+
+class CaptureBackend(ABC):
+    """Schnittstelle: capture(out_dir, timeout) legt ein JPEG ab und füllt last_info."""
+
+    name = "base"
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self.last_info: Dict[str, Any] = {}
+
+    @abstractmethod
+    def capture(self, out_dir: Path, timeout: Optional[float] = None) -> Optional[Path]:
+        """Pfad des aufgenommenen JPEGs oder None (keine Aufnahme)."""
+
+
+class FrameBackend(CaptureBackend):
+    """Basis der Backends mit eigenen Frames: schärfsten wählen, nachbearbeiten, als JPEG ablegen."""
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        c = cfg.get("capture", {})
+        self.prefix = Path(cfg.get("local_file", "IMG_4903.jpg")).stem
+        self.quality = int(c.get("jpeg_quality", 95))
+        self.postprocess = bool(c.get("postprocess", True))
+
+    @abstractmethod
+    def frames(self, timeout: Optional[float]) -> List[Image.Image]:
+        """Kandidaten-Frames einer Aufnahme."""
+
+    def capture(self, out_dir: Path, timeout: Optional[float] = None) -> Optional[Path]:
+        t0 = time.monotonic()
+        frames = self.frames(timeout)
+        if not frames:
+            return None
+        scores = [focus_measure(f) for f in frames]
+        best = max(range(len(frames)), key=scores.__getitem__)
+        img = frames[best].convert("RGB")
+
+        if self.postprocess:
+            stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+            img = _postprocess(img, f"{stamp} - RaspberryCam - CPU: {_cpu_temp()}")
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = (out_dir / f"{self.prefix}_{ts}.jpg").resolve()
+        img.save(out, "JPEG", quality=self.quality)
+
+        self.last_info = {
+            "backend": self.name,
+            "seconds": round(time.monotonic() - t0, 3),
+            "frames": len(frames),
+            "focus": round(scores[best], 1),
+        }
+        return out
+
+
+class FswebcamBackend(CaptureBackend):
+    """Adapter für das bisherige Skript (Gerät wird pro Zyklus neu geöffnet)."""
+
+    name = "fswebcam"
+
+    def __init__(self, cfg: Dict[str, Any], script_path: Path, env: Optional[dict] = None):
+        super().__init__(cfg)
+        self.script_path = script_path
+        self.env = env
+
+    def capture(self, out_dir: Path, timeout: Optional[float] = None) -> Optional[Path]:
+        t0 = time.monotonic()
+        path = capture_fswebcam(self.script_path, env=self.env, timeout=timeout)
+        self.last_info = {"backend": self.name, "seconds": round(time.monotonic() - t0, 3), "frames": 1}
+        return path
+
+
+class DeviceBackend(FrameBackend):
+    """
+    Hält das Videogerät offen (OpenCV); ein Hintergrund-Thread liest nur während
+    capture() ring_size Frames in einen Ringpuffer, capture() nimmt den schärfsten statt
+    blind zehn Frames zu verwerfen. Zwischen den Aufnahmen ruht der Thread (kein
+    Dauer-Dekodieren). Lohnt sich nur im Dauerprozess (`main.py --loop`) – bei einem
+    Cron-Lauf pro Zyklus wird das Gerät jedes Mal neu geöffnet.
+    Nach dem Öffnen werden wie bei `fswebcam --skip` erst warmup Frames bzw. warmup_s
+    Sekunden verworfen (Belichtung/Weißabgleich regeln sich ein), bei jeder weiteren
+    Aufnahme nur die im Treiber liegengebliebenen Puffer.
+    """
+
+    name = "device"
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        c = cfg.get("capture", {})
+        try:
+            import cv2  # optional, nur für dieses Backend
+        except ImportError as e:
+            raise RuntimeError("capture.backend 'device' benötigt opencv-python (cv2)") from e
+        self._cv2 = cv2
+        device = cfg.get("video_device", "/dev/video0")
+        self.cap = cv2.VideoCapture(device)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Videogerät nicht verfügbar: {device}")
+        w, h = c.get("resolution", [1920, 1080])
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, int(w))
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, int(h))
+        self.flip = bool(c.get("flip", True))
+        self.ring = collections.deque(maxlen=int(c.get("ring_size", 5)))
+        self.warmup = int(c.get("warmup", 10))            # Frames
+        self.warmup_s = float(c.get("warmup_s", 0.0))     # und/oder Sekunden
+        self._opened = time.monotonic()
+        self._skip = self.warmup
+        self._active = threading.Event()
+        self._filled = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._reader, name="capture-ring", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _reader(self) -> None:
+        # Nur Rohdaten puffern; Konvertierung erst für die wenigen ausgewählten Frames
+        while not self._stop.is_set():
+            if not self._active.wait(0.5):
+                continue
+            ok, frame = self.cap.read()
+            if not ok:
+                time.sleep(0.05)
+                continue
+            if self._skip > 0 or time.monotonic() - self._opened < self.warmup_s:
+                self._skip -= 1
+                continue
+            self.ring.append(frame)
+            if len(self.ring) == self.ring.maxlen:
+                self._active.clear()   # Ring voll → bis zur nächsten Aufnahme ruhen
+                self._filled.set()
+
+    def frames(self, timeout: Optional[float]) -> List[Image.Image]:
+        self.ring.clear()
+        self._filled.clear()
+        if self._skip <= 0:
+            self._skip = _STALE_BUFFERS
+        self._active.set()
+        self._filled.wait(timeout)
+        self._active.clear()
+        out = []
+        for frame in list(self.ring):
+            im = Image.fromarray(self._cv2.cvtColor(frame, self._cv2.COLOR_BGR2RGB))
+            out.append(im.rotate(180) if self.flip else im)
+        return out
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.cap.release()
+
+
+class FileBackend(FrameBackend):
+    """
+    Quelle ohne Kamera: einzelne Datei, Verzeichnis (Bilder reihum) oder "synthetic"
+    (erzeugte Szene mit Rauschen). Liefert ring_size Frames wie das Geräte-Backend.
+    """
+
+    name = "file"
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        c = cfg.get("capture", {})
+        self.source = str(c.get("source", "synthetic"))
+        self.n = int(c.get("ring_size", 3))
+        self.size = tuple(c.get("resolution", [640, 360]))
+        self._files = None
+        if self.source != "synthetic":
+            src = Path(self.source)
+            if src.is_dir():
+                files = sorted(p for p in src.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+                if not files:
+                    raise FileNotFoundError(f"capture.source enthält keine Bilder (jpg/png): {src}")
+            elif src.is_file():
+                files = [src]
+            else:
+                raise FileNotFoundError(f"capture.source nicht gefunden: {src}")
+            self._files = itertools.cycle(files)
+
+    def _synthetic(self, i: int) -> Image.Image:
+        w, h = self.size
+        sky = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+        im = Image.merge("RGB", (sky.getchannel(0).point(lambda v: 90 + v // 3),
+                                 sky.getchannel(0).point(lambda v: 140 + v // 4),
+                                 Image.new("L", (w, h), 220)))
+        noise = Image.effect_noise((w, h), 10 + 5 * i).convert("RGB")
+        return Image.blend(im, noise, 0.15).filter(ImageFilter.GaussianBlur(random.random() * 2))
+
+    def frames(self, timeout: Optional[float]) -> List[Image.Image]:
+        if self._files is None:
+            return [self._synthetic(i) for i in range(self.n)]
+        out = []
+        for _ in range(self.n):
+            with Image.open(next(self._files)) as im:
+                out.append(im.convert("RGB"))
+        return out
+
+
+_BACKENDS: Dict[str, CaptureBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_backend(cfg: Dict[str, Any], script_path: Path, env: Optional[dict] = None) -> CaptureBackend:
+    """Backend laut cfg["capture"]["backend"]; Geräte-/Datei-Backends bleiben pro Prozess offen."""
+    kind = cfg.get("capture", {}).get("backend", "fswebcam")
+    if kind == "fswebcam":
+        return FswebcamBackend(cfg, script_path, env)
+    key = f"{kind}:{cfg.get('name', 'default')}"
+    with _BACKENDS_LOCK:
+        if key not in _BACKENDS:
+            if kind == "device":
+                _BACKENDS[key] = DeviceBackend(cfg)
+            elif kind == "file":
+                _BACKENDS[key] = FileBackend(cfg)
+            else:
+                raise ValueError(f"Unbekanntes Capture-Backend: {kind}")
+        return _BACKENDS[key]
+
+
+# ============================ Benchmark ============================
+
+def _bench_backend(make, runs: int, timeout: float) -> Dict[str, Any]:
+    """Einrichtung (Öffnen, Aufwärmen) und Median je Aufnahme für ein Backend."""
+    import statistics
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="raspberry-cam-capture-") as tmp:
+        t0 = time.perf_counter()
+        backend = make()
+        times = []
+        try:
+            for i in range(max(1, runs)):
+                t = time.perf_counter()
+                if backend.capture(Path(tmp), timeout=timeout) is None:
+                    raise RuntimeError("keine Aufnahme")
+                times.append(time.perf_counter() - t)
+                if i == 0:
+                    first = time.perf_counter() - t0   # erste Aufnahme inkl. Öffnen/Aufwärmen
+        finally:
+            if isinstance(backend, DeviceBackend):
+                backend.close()
+    return {"first_s": round(first, 3), "median_s": round(statistics.median(times), 3),
+            "frames": backend.last_info.get("frames"), "focus": backend.last_info.get("focus")}
+
+
+# CLI (Backends vergleichen: erste Aufnahme inkl. Öffnen = Cron-Lauf, danach Median je
+# Aufnahme = Dauerbetrieb mit main.py --loop)
+if __name__ == "__main__":
+    import argparse
+    import shutil
+
+    parser = argparse.ArgumentParser(description="Zeitvergleich der Capture-Backends")
+    parser.add_argument("--backends", nargs="+", default=["file", "device", "fswebcam"],
+                        choices=["file", "device", "fswebcam"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--source", default="synthetic", help="Quelle für das file-Backend")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument("--device", default="/dev/video0")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    script = Path(__file__).resolve().parent / "02_take_webcam_picture.sh"
+    cfg = {"video_device": args.device,
+           "capture": {"source": args.source, "resolution": args.resolution}}
+    makers = {
+        "file": lambda: FileBackend(cfg),
+        "device": lambda: DeviceBackend(cfg),
+        "fswebcam": lambda: FswebcamBackend(cfg, script),
+    }
+    for kind in args.backends:
+        if kind == "fswebcam" and shutil.which("fswebcam") is None:
+            print(f"{kind:>8}: übersprungen (fswebcam nicht installiert)")
+            continue
+        try:
+            r = _bench_backend(makers[kind], args.runs, args.timeout)
+        except Exception as e:
+            print(f"{kind:>8}: übersprungen ({e})")
+            continue
+        focus = "" if r["focus"] is None else f", Schärfe {r['focus']}"
+        print(f"{kind:>8}: Cron (inkl. Öffnen) {r['first_s']:.3f} s | --loop {r['median_s']:.3f} s "
+              f"(Median, {r['frames']} Frames{focus})")
@@ -1,10 +1,13 @@
 import shutil
 from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional
 
-def classify_weather(owm: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+from modules import persist
+
+def classify_weather(owm: Dict[str, Any], rain: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
     """
     Nimmt OWM-Objekt (Roh-JSON) und gibt (classification, classification_detail) zurück.
+    rain: optionales Ergebnis von rainrate.measure() → Radar-Intensität im Detail.
     Mutiert NICHT das übergebene Objekt.
     """
     clouds = owm.get("clouds", {}).get("all", None)
@@ -77,6 +80,9 @@ def classify_weather(owm: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
         "wind_speed_ms": wind_speed,
         "clouds_percent": clouds,
         "weather_id": wid,
+        "rain_mmh": rain.get("current_mmh") if rain else None,
+        "rain_area_mmh": rain.get("area_mmh") if rain else None,
+        "rain_fraction": rain.get("rain_fraction") if rain else None,
     }
     return classification, detail
 
@@ -94,7 +100,7 @@ def copy_to_classified(weather_json: dict, old_path: Path, json_path: Path, clas
     dst_json = target_dir / json_path.name
 
     shutil.copy2(old_path, dst_img)
-    shutil.copy2(json_path, dst_json)
+    persist.write_durable(dst_json, json_path.read_bytes())
 
     print(f"📁 Kopiert nach: {target_dir}")
     print(f"   - {dst_img.name}")
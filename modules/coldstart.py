@@ -0,0 +1,139 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+# Kaltstart-Wächter für die Cron-Läufe: misst per `python -X importtime`, was `import main`
+# kostet, und prüft in einem simulierten Nachtlauf, dass keine Tages-Module geladen werden.
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Dürfen weder beim Import von main noch im Nachtlauf geladen werden
+DAY_ONLY = (
+    "PIL",
+    "modules.capture",
+    "modules.scenechange",
+    "modules.rainintensity",
+    "modules.rainrate",
+    "modules.nowcast",
+    "modules.classify",
+    "modules.upload",
+)
+# Zusätzlich beim reinen Import (werden erst im Lauf gebraucht)
+IMPORT_LAZY = ("requests", "smtplib")
+
+# Nachtlauf ohne Netz: OWM-Abruf ersetzt, Zustand in einem Temp-Verzeichnis
+_NIGHT_SCRIPT = """
+import json, sys, tempfile, time
+t0 = time.perf_counter()
+from pathlib import Path
+import main
+from modules import openweathermap
+openweathermap._fetch = lambda api_key, city, timeout=10: {
+    "name": city, "dt": int(time.time()), "coord": {}, "wind": {"speed": 3.0}}
+with tempfile.TemporaryDirectory(prefix="raspberry-cam-coldstart-") as d:
+    cfg = {"data_dir": d, "openweathermap_api_key": "sim"}
+    main.run_site(Path(d), cfg, Path(main.__file__).parent / "modules", is_daylight=False)
+print(json.dumps({"ms": (time.perf_counter() - t0) * 1000, "modules": sorted(sys.modules)}))
+"""
+
+
+def _run(args: List[str]) -> Tuple[subprocess.CompletedProcess, float]:
+    t0 = time.perf_counter()
+    res = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=False)
+    return res, (time.perf_counter() - t0) * 1000
+
+
+def importtime(module: str = "main") -> Dict[str, Tuple[int, int]]:
+    """
+    {modul: (self_us, cumulative_us)} für module und alles, was es nachlädt – aus
+    `python -X importtime`. Die Ausgabe listet Kinder eingerückt vor dem Elternmodul;
+    Module des Interpreterstarts (site, .pth-Dateien) bleiben außen vor.
+    """
+    res, _ = _run(["-X", "importtime", "-c", f"import {module}"])
+    if res.returncode != 0:
+        raise RuntimeError(f"Import fehlgeschlagen: {res.stderr.strip()[-500:]}")
+    group: Dict[str, Tuple[int, int]] = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            entry = (int(parts[0]), int(parts[1]))
+        except (ValueError, IndexError):
+            continue  # Kopfzeile
+        name = parts[2].rstrip()
+        group[name.strip()] = entry
+        if not name.startswith("  "):          # oberste Ebene schließt eine Gruppe ab
+            if name.strip() == module:
+                return group
+            group = {}
+    raise RuntimeError(f"{module} nicht in der importtime-Ausgabe")
+
+
+def check(budget_ms: float, night_budget_ms: float, runs: int) -> Dict[str, Any]:
+    """Misst runs-mal und vergleicht die Mediane mit den Budgets; Rückgabe inkl. Verstößen."""
+    _run(["-c", "import main"])  # .pyc erzeugen, zählt nicht
+
+    main_ms, wall_ms, base_ms, night_ms = [], [], [], []
+    last: Dict[str, Tuple[int, int]] = {}
+    night_mods: List[str] = []
+    for _ in range(runs):
+        last = importtime("main")
+        main_ms.append(last["main"][1] / 1000)
+        wall_ms.append(_run(["-c", "import main"])[1])
+        base_ms.append(_run(["-c", "pass"])[1])
+        res, _ = _run(["-c", _NIGHT_SCRIPT])
+        if res.returncode != 0:
+            raise RuntimeError(f"Nachtlauf fehlgeschlagen: {res.stderr.strip()[-500:]}")
+        r = json.loads(res.stdout.strip().splitlines()[-1])
+        night_ms.append(r["ms"])
+        night_mods = r["modules"]
+
+    def loaded(mods, names):
+        return sorted(n for n in names if any(m == n or m.startswith(n + ".") for m in mods))
+
+    result = {
+        "import_main_ms": round(statistics.median(main_ms), 1),
+        "startup_ms": round(statistics.median(wall_ms), 1),
+        "interpreter_ms": round(statistics.median(base_ms), 1),
+        "night_cycle_ms": round(statistics.median(night_ms), 1),
+        "slowest": sorted(((n, c / 1000) for n, (_, c) in last.items() if n != "main"),
+                          key=lambda x: -x[1])[:8],
+        "violations": [],
+    }
+    v = result["violations"]
+    for n in loaded(last, DAY_ONLY + IMPORT_LAZY):
+        v.append(f"import main lädt {n}")
+    for n in loaded(night_mods, DAY_ONLY):
+        v.append(f"Nachtlauf lädt {n}")
+    if result["import_main_ms"] > budget_ms:
+        v.append(f"import main {result['import_main_ms']} ms > {budget_ms} ms")
+    if result["night_cycle_ms"] > night_budget_ms:
+        v.append(f"Nachtlauf {result['night_cycle_ms']} ms > {night_budget_ms} ms")
+    return result
+
+
+# CLI (Kaltstart-Budget prüfen; Exit-Code 1 bei Verstoß)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-/Startzeit-Wächter für Cron-Läufe")
+    parser.add_argument("--budget-ms", type=float, default=60.0, help="Budget für `import main` (Median)")
+    parser.add_argument("--night-budget-ms", type=float, default=250.0,
+                        help="Budget für einen Nachtlauf inkl. Imports (ohne Netz, Median)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    r = check(args.budget_ms, args.night_budget_ms, args.runs)
+    print(f"import main: {r['import_main_ms']} ms | Start (Interpreter + main): {r['startup_ms']} ms "
+          f"(nackter Interpreter {r['interpreter_ms']} ms) | Nachtlauf: {r['night_cycle_ms']} ms")
+    for name, ms in r["slowest"]:
+        print(f"  {ms:8.1f} ms  {name}")
+    if r["violations"]:
+        for msg in r["violations"]:
+            print(f"❌ {msg}")
+        sys.exit(1)
+    print("✅ Kaltstart im Budget")
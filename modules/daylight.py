@@ -0,0 +1,84 @@
+import math
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+# Tag/Nacht ohne Subprozess: Sonnenhöhe nach den NOAA-Näherungsformeln (Genauigkeit
+# ~0,01°). "Tag" heißt wie bei `sunwait list civil`: zwischen ziviler Morgen- und
+# Abenddämmerung, also Sonnenhöhe über −6°.
+
+CIVIL_TWILIGHT = -6.0
+
+
+def _get_defaults(cfg):
+    d = cfg.get("daylight", {})
+    loc = d.get("location") or cfg.get("center")
+    return {
+        # "auto": Python, Standort aus Config oder aus dem Gate-Skript; "script": immer das Skript
+        "method": d.get("method", "auto"),
+        "location": tuple(loc) if loc else None,   # (lat, lon)
+        "elevation": float(d.get("elevation", CIVIL_TWILIGHT)),
+    }
+
+
+def sun_elevation(lat: float, lon: float, when: Optional[float] = None) -> float:
+    """Sonnenhöhe in Grad für (lat, lon) zum Unix-Zeitpunkt when (Standard: jetzt)."""
+    t = time.time() if when is None else when
+    n = t / 86400.0 + 2440587.5 - 2451545.0          # Tage seit J2000.0
+    mean_lon = (280.460 + 0.9856474 * n) % 360
+    g = math.radians((357.528 + 0.9856003 * n) % 360)
+    ecl_lon = math.radians(mean_lon + 1.915 * math.sin(g) + 0.020 * math.sin(2 * g))
+    eps = math.radians(23.439 - 0.0000004 * n)
+    ra = math.atan2(math.cos(eps) * math.sin(ecl_lon), math.cos(ecl_lon))
+    dec = math.asin(math.sin(eps) * math.sin(ecl_lon))
+    gmst = (18.697374558 + 24.06570982441908 * n) % 24
+    ha = math.radians(gmst * 15 + lon) - ra
+    phi = math.radians(lat)
+    return math.degrees(math.asin(math.sin(phi) * math.sin(dec) + math.cos(phi) * math.cos(dec) * math.cos(ha)))
+
+
+def _parse_coord(s: str) -> float:
+    """"49.454N" / "11.078E" / "-3.2" → vorzeichenbehafteter Wert in Grad."""
+    s = s.strip()
+    if s and s[-1].upper() in "NSEW":
+        v = float(s[:-1])
+        return -v if s[-1].upper() in "SW" else v
+    return float(s)
+
+
+def location_from_script(script_path: Path) -> Optional[Tuple[float, float]]:
+    """LAT/LON aus 00_daylight_gate.sh lesen, damit dort gepflegte Koordinaten weiter gelten."""
+    try:
+        text = script_path.read_text(encoding="utf-8")
+        # LAT="49.454N" oder LAT="${LAT:-49.454N}" (Standardwert, falls main.py keinen setzt)
+        lat = re.search(r'^LAT="?(?:\$\{LAT:-)?([^"\s}]+)', text, re.M)
+        lon = re.search(r'^LON="?(?:\$\{LON:-)?([^"\s}]+)', text, re.M)
+        if lat and lon:
+            return _parse_coord(lat.group(1)), _parse_coord(lon.group(1))
+    except Exception:
+        pass
+    return None
+
+
+def script_env(cfg: Dict[str, Any]) -> Dict[str, str]:
+    """LAT/LON des Standorts im sunwait-Format für 00_daylight_gate.sh (leer ohne Standort)."""
+    loc = _get_defaults(cfg)["location"]
+    if loc is None:
+        return {}
+    lat, lon = float(loc[0]), float(loc[1])
+    return {"LAT": f"{abs(lat)}{'N' if lat >= 0 else 'S'}", "LON": f"{abs(lon)}{'E' if lon >= 0 else 'W'}"}
+
+
+def is_daylight(cfg: Dict[str, Any], script_path: Path, when: Optional[float] = None) -> Optional[bool]:
+    """
+    True/False ohne Subprozess; None, wenn kein Standort bekannt ist oder method "script"
+    verlangt – dann entscheidet wie bisher das Gate-Skript.
+    """
+    d = _get_defaults(cfg)
+    if d["method"] == "script":
+        return None
+    loc = d["location"] or location_from_script(script_path)
+    if loc is None:
+        return None
+    return sun_elevation(loc[0], loc[1], when) > d["elevation"]
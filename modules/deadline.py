@@ -0,0 +1,90 @@
+import os
+import signal
+import subprocess
+import time
+from typing import Dict, Any, List, Optional
+
+
+def _get_defaults(cfg):
+    d = cfg.get("deadline", {})
+    return {
+        "budget": float(d.get("budget", 240)),
+        # Mindest-Restzeit, damit eine optionale Stufe überhaupt versucht wird.
+        # Reihenfolge des Abwerfens: Radar live → Nowcast → Upload → OWM live.
+        "radar_min": float(d.get("radar_min", 60)),
+        "nowcast_min": float(d.get("nowcast_min", 40)),
+        "upload_min": float(d.get("upload_min", 30)),
+        "owm_min": float(d.get("owm_min", 10)),
+    }
+
+
+class Deadline:
+    """
+    Zeitbudget eines ganzen Zyklus. Wird von main() an alle Netzwerk- und
+    Subprozess-Aufrufe weitergereicht; jede Stufe begrenzt ihren Timeout auf die
+    Restzeit und meldet per degrade(), wenn sie auf einen Fallback ausweicht.
+    """
+
+    def __init__(self, budget: float, *, start: Optional[float] = None, limits: Optional[Dict[str, float]] = None):
+        self.start = time.monotonic() if start is None else start
+        self.end = self.start + budget
+        self.limits = limits or {}
+        self.degraded: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any], start: Optional[float] = None) -> "Deadline":
+        d = _get_defaults(cfg)
+        return cls(d["budget"], start=start, limits=d)
+
+    def remaining(self) -> float:
+        return max(0.0, self.end - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, cap: float, floor: float = 0.5) -> float:
+        """Timeout für einen einzelnen Aufruf: höchstens cap, höchstens die Restzeit."""
+        return max(floor, min(cap, self.remaining()))
+
+    def allows(self, stage: str) -> bool:
+        """True, wenn für die optionale Stufe (radar/nowcast/upload/owm) noch genug Zeit bleibt."""
+        return self.remaining() >= float(self.limits.get(f"{stage}_min", 0.0))
+
+    def degrade(self, stage: str, reason: str) -> None:
+        self.degraded.append({"stage": stage, "reason": reason, "remaining_s": round(self.remaining(), 1)})
+        print(f"⏱️ Degradiert: {stage} ({reason}, Rest {self.remaining():.1f} s)")
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    """Ganze Prozessgruppe beenden (erst TERM, dann KILL für Nachzügler)."""
+    for sig, wait in ((signal.SIGTERM, 2.0), (signal.SIGKILL, None)):
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+        if wait is not None:
+            try:
+                proc.wait(wait)
+            except subprocess.TimeoutExpired:
+                pass
+
+
+def run_group(args, *, timeout: Optional[float] = None, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Wie subprocess.run, aber in eigener Sitzung: bei Timeout wird nicht nur das Skript,
+    sondern auch alles beendet, was es gestartet hat (fswebcam, sshpass/sftp, sunwait) –
+    sonst hielte z. B. fswebcam /dev/video0 bis in den nächsten Cron-Lauf offen.
+    """
+    with subprocess.Popen(args, start_new_session=True, **kwargs) as proc:
+        try:
+            out, err = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_group(proc)
+            proc.communicate()
+            raise
+        except BaseException:
+            _kill_group(proc)
+            raise
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args, out, err)
+    return subprocess.CompletedProcess(args, proc.returncode, out, err)
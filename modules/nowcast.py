@@ -0,0 +1,287 @@
+import argparse
+import io
+import json
+import math
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, List
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+from modules import persist
+from modules.rainintensity import _lonlat_to_px
+from modules.rainrate import UNIVERSAL_BLUE, dbz_to_mmh, _lut
+
+# Nowcast per Bewegungsextrapolation:
+#   1) Jede neue Radar-Epoche wird einmal zu einem verkleinerten dBZ-Raster (L-Bild,
+#      Wert = 2·dBZ, 0 = kein Echo) dekodiert und in einem Ringpuffer abgelegt.
+#   2) Block-Matching zwischen aufeinanderfolgenden Rastern (ImageChops, alles in C)
+#      liefert eine Verlagerung in Rasterpixeln pro Minute.
+#   3) Vorhersage am Standort: semi-Lagrange – der Wert, der jetzt stromaufwärts liegt.
+
+
+def _get_defaults(cfg):
+    n = cfg.get("nowcast", {})
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    state_dir = (base_dir / "json" / "nowcast")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    loc = n.get("location") or cfg.get("rain", {}).get("location") or cfg.get("center")
+    return {
+        "enabled": bool(n.get("enabled", True)),
+        "location": tuple(loc) if loc else None,   # (lat, lon)
+        "leads": [int(m) for m in n.get("leads", [15, 30, 45, 60])],   # Minuten
+        "history": max(2, int(n.get("history", 4))),
+        "downscale": max(1, int(n.get("downscale", 2))),
+        "max_shift": int(n.get("max_shift", 8)),        # Suchfenster in Rasterpixeln
+        "max_gap": float(n.get("max_gap", 30)),         # Minuten zwischen zwei Frames
+        "min_echo": float(n.get("min_echo", 0.005)),    # Mindestanteil Echo für Matching
+        "radius_px": int(n.get("radius_px", 1)),
+        "min_alpha": int(cfg.get("rain", {}).get("min_alpha", 1)),
+        "palette": [(float(z), c) for z, c in cfg.get("rain", {}).get("palette", UNIVERSAL_BLUE)],
+        "save_frames": bool(n.get("save_frames", False)),
+        "state_file": Path(n.get("state_file", state_dir / "nowcast_state.json")),
+        "grid_dir": state_dir,
+    }
+
+
+def _load_state(path: Path) -> Dict[str, Any]:
+    if persist.exists(path):
+        try:
+            return json.loads(persist.read_text(path))
+        except Exception:
+            pass
+    return {"frames": [], "key": None, "result": None}
+
+
+# ============================ Raster ============================
+
+def _grid(overlay: Image.Image, palette, min_alpha: int, downscale: int) -> Image.Image:
+    """
+    Radar-Overlay → dBZ-Raster (L, 2·dBZ). Palettenindex per quantize() wie in rainrate,
+    Indexbild per point() auf dBZ abgebildet, Pixel ohne Echo auf 0; dann BOX-verkleinert.
+    """
+    pal_img, dbz, _ = _lut(palette)
+    idx = overlay.convert("RGB").quantize(palette=pal_img, dither=0)
+    raw = Image.frombytes("L", idx.size, idx.tobytes())
+    val = raw.point([min(255, int(round(2 * z))) for z in dbz])
+    mask = overlay.getchannel("A").point([255 if a >= min_alpha else 0 for a in range(256)])
+    grid = Image.composite(val, Image.new("L", val.size, 0), mask)
+    if downscale > 1:
+        grid = grid.resize((max(1, grid.width // downscale), max(1, grid.height // downscale)), Image.BOX)
+    return grid
+
+
+def _echo_fraction(grid: Image.Image) -> float:
+    hist = grid.histogram()
+    total = sum(hist)
+    return (total - hist[0]) / total if total else 0.0
+
+
+def _match(prev: Image.Image, curr: Image.Image, max_shift: int, min_echo: float) -> Optional[Tuple[float, float]]:
+    """
+    Verschiebung (dx, dy) in Rasterpixeln, die prev am besten auf curr abbildet.
+    Verglichen wird der Innenbereich von prev (Rand = max_shift, kein Wraparound) mit
+    gleich großen, verschobenen Ausschnitten von curr; Fehler = mittlere absolute
+    Differenz. Subpixel per Parabel durch die Nachbarn des Minimums.
+    """
+    m = max_shift
+    w, h = prev.size
+    if curr.size != prev.size or w <= 2 * m + 4 or h <= 2 * m + 4:
+        return None
+    ref = prev.crop((m, m, w - m, h - m))
+    if _echo_fraction(ref) < min_echo:
+        return None
+
+    err: Dict[Tuple[int, int], float] = {}
+    for dy in range(-m, m + 1):
+        for dx in range(-m, m + 1):
+            cand = curr.crop((m + dx, m + dy, w - m + dx, h - m + dy))
+            err[(dx, dy)] = ImageStat.Stat(ImageChops.difference(ref, cand)).mean[0]
+    bx, by = min(err, key=err.__getitem__)
+
+    def _sub(e_minus, e0, e_plus):
+        if e_minus is None or e_plus is None:
+            return 0.0
+        denom = e_minus - 2 * e0 + e_plus
+        return 0.5 * (e_minus - e_plus) / denom if denom > 0 else 0.0
+
+    e0 = err[(bx, by)]
+    ox = _sub(err.get((bx - 1, by)), e0, err.get((bx + 1, by)))
+    oy = _sub(err.get((bx, by - 1)), e0, err.get((bx, by + 1)))
+    return bx + ox, by + oy
+
+
+def _velocity(frames: List[Tuple[int, Image.Image]], max_shift: int, min_echo: float,
+              max_gap: float) -> Optional[Tuple[float, float, int]]:
+    """Mittlere Verlagerung (vx, vy) in Rasterpixeln/Minute über alle Frame-Paare + Anzahl Paare."""
+    vs = []
+    for (t0, g0), (t1, g1) in zip(frames, frames[1:]):
+        dt = (t1 - t0) / 60.0
+        if dt <= 0 or dt > max_gap:
+            continue
+        shift = _match(g0, g1, max_shift, min_echo)
+        if shift is not None:
+            vs.append((shift[0] / dt, shift[1] / dt))
+    if not vs:
+        return None
+    return sum(v[0] for v in vs) / len(vs), sum(v[1] for v in vs) / len(vs), len(vs)
+
+
+def _sample(grid: Image.Image, x: float, y: float, r: int) -> Optional[Dict[str, float]]:
+    """Mittlere Intensität (mm/h) und Maximum im Fenster ±r um (x, y); None außerhalb des Rasters."""
+    xi, yi = int(round(x)), int(round(y))
+    if not (0 <= xi < grid.width and 0 <= yi < grid.height):
+        return None
+    win = grid.crop((max(0, xi - r), max(0, yi - r), min(grid.width, xi + r + 1), min(grid.height, yi + r + 1)))
+    hist = win.histogram()
+    total = sum(hist)
+    # Werte < 2·10 dBZ sind nur angeschnittene Echos beim Verkleinern → trocken
+    mmh = [dbz_to_mmh(v / 2.0) if v >= 20 else 0.0 for v in range(256)]
+    mean = sum(c * mmh[v] for v, c in enumerate(hist) if c) / total
+    vmax = max((v for v, c in enumerate(hist) if c), default=0)
+    return {"mmh": round(mean, 3), "dbz": round(vmax / 2.0, 1) if vmax >= 20 else None}
+
+
+# ============================ Öffentliche API ============================
+
+def forecast(
+    cfg: Dict[str, Any],
+    radar_cache_path: Path,
+    location: Optional[Tuple[float, float]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Regen-Ausblick für die nächsten 15–60 Minuten am Kamerastandort aus den zuletzt
+    gecachten Radar-Frames. Neue Epochen werden einmal dekodiert und im Ringpuffer
+    abgelegt; das Ergebnis wird pro Epoche gecacht (weitere Läufe lesen nur JSON).
+    """
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return None
+    location = d["location"] or location
+    if location is None:
+        return None
+
+    radar_cache_path = Path(radar_cache_path)
+    meta_path = radar_cache_path.with_suffix(".json")
+    if not persist.exists(radar_cache_path) or not persist.exists(meta_path):
+        return None
+    try:
+        meta = json.loads(persist.read_text(meta_path))
+        epoch, zoom, origin = int(meta["epoch"]), int(meta["zoom"]), list(meta["origin"])
+    except Exception:
+        return None
+
+    state = _load_state(d["state_file"])
+    key = {"epoch": epoch, "location": [round(location[0], 5), round(location[1], 5)],
+           "zoom": zoom, "origin": origin, "leads": d["leads"]}
+    if state.get("key") == key and state.get("result") is not None:
+        return state["result"]
+
+    t0 = time.perf_counter()
+    f = d["downscale"]
+    overlay = None
+
+    # Ringpuffer: anderer Ausschnitt/Zoom → Verlauf verwerfen
+    frames_meta = [fr for fr in state.get("frames", [])
+                   if fr.get("zoom") == zoom and fr.get("origin") == origin and fr.get("downscale") == f]
+    if not any(fr["epoch"] == epoch for fr in frames_meta):
+        overlay = Image.open(io.BytesIO(persist.read_bytes(radar_cache_path))).convert("RGBA")
+        grid = _grid(overlay, d["palette"], d["min_alpha"], f)
+        used = {fr["slot"] for fr in frames_meta[-(d["history"] - 1):]}
+        slot = next(i for i in range(d["history"]) if i not in used)
+        buf = io.BytesIO()
+        grid.save(buf, "PNG")
+        persist.write_bytes(d["grid_dir"] / f"grid_{slot}.png", buf.getvalue())
+        frames_meta.append({"epoch": epoch, "slot": slot, "zoom": zoom, "origin": origin, "downscale": f})
+    frames_meta = sorted(frames_meta, key=lambda fr: fr["epoch"])[-d["history"]:]
+
+    frames: List[Tuple[int, Image.Image]] = []
+    for fr in frames_meta:
+        try:
+            g = Image.open(io.BytesIO(persist.read_bytes(d["grid_dir"] / f"grid_{fr['slot']}.png")))
+            g.load()
+            frames.append((fr["epoch"], g))
+        except Exception:
+            continue
+    latest = frames[-1][1] if frames else None
+
+    vel = _velocity(frames, d["max_shift"], d["min_echo"], d["max_gap"])
+    vx, vy, pairs = vel if vel else (0.0, 0.0, 0)
+
+    # Standort im Raster
+    px, py = _lonlat_to_px(location[0], location[1], zoom)
+    gx, gy = (px - origin[0]) / f, (py - origin[1]) / f
+
+    leads = []
+    for lead in d["leads"]:
+        # Semi-Lagrange: was in lead Minuten hier ist, liegt jetzt um v·lead stromaufwärts
+        s = _sample(latest, gx - vx * lead, gy - vy * lead, d["radius_px"]) if latest is not None else None
+        leads.append({"lead_min": lead,
+                      "mmh": s["mmh"] if s else None,
+                      "dbz": s["dbz"] if s else None})
+
+    # Geschwindigkeit in km/h und Zugrichtung (wohin, Kompassgrad)
+    m_per_px = 40075016.686 * math.cos(math.radians(location[0])) / (256 * 2 ** zoom) * f
+    speed_kmh = math.hypot(vx, vy) * m_per_px * 60 / 1000.0
+    direction = (math.degrees(math.atan2(vx, -vy)) + 360) % 360 if pairs else None
+
+    result = {
+        "radar_epoch": epoch,
+        "frames": len(frames),
+        "pairs": pairs,
+        "motion": {
+            "vx_px_min": round(vx, 4), "vy_px_min": round(vy, 4),
+            "speed_kmh": round(speed_kmh, 1) if pairs else None,
+            "direction_deg": round(direction) if direction is not None else None,
+        },
+        "leads": leads,
+        "max_mmh": max((e["mmh"] for e in leads if e["mmh"] is not None), default=None),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+    if d["save_frames"] and pairs:
+        # Vorhersage-Overlays in voller Auflösung (verschobenes letztes Overlay) neben dem Cache
+        if overlay is None:
+            overlay = Image.open(io.BytesIO(persist.read_bytes(radar_cache_path))).convert("RGBA")
+        for lead in d["leads"]:
+            sx, sy = vx * lead * f, vy * lead * f
+            moved = overlay.transform(overlay.size, Image.AFFINE, (1, 0, -sx, 0, 1, -sy),
+                                      resample=Image.BILINEAR, fillcolor=(0, 0, 0, 0))
+            buf = io.BytesIO()
+            moved.save(buf, "PNG")
+            persist.write_bytes(radar_cache_path.with_name(f"radar_nowcast_{lead}.png"), buf.getvalue())
+
+    persist.write_text(d["state_file"], json.dumps({"frames": frames_meta, "key": key, "result": result}))
+    return result
+
+
+# ============================ Selbsttest (synthetische Zelle) ============================
+
+def _selftest(size: int, shift: Tuple[float, float], n: int, max_shift: int) -> Dict[str, Any]:
+    """Regenzelle, die sich pro 10 Minuten um shift Rasterpixel bewegt – wird die Bewegung getroffen?"""
+    frames = []
+    for i in range(n):
+        g = Image.new("L", (size, size), 0)
+        cx, cy = size * 0.35 + shift[0] * i, size * 0.4 + shift[1] * i
+        draw = ImageDraw.Draw(g)
+        draw.ellipse((cx - 20, cy - 12, cx + 20, cy + 12), fill=70)
+        draw.ellipse((cx - 8, cy - 5, cx + 8, cy + 5), fill=100)
+        frames.append((i * 600, g.filter(ImageFilter.GaussianBlur(2))))
+    t0 = time.perf_counter()
+    vx, vy, pairs = _velocity(frames, max_shift, 0.001, 30) or (0.0, 0.0, 0)
+    return {"vx": round(vx * 10, 2), "vy": round(vy * 10, 2), "pairs": pairs,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+# CLI (nur Selbsttest/Benchmark)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nowcast-Selbsttest mit synthetischer Regenzelle")
+    parser.add_argument("--size", type=int, default=256, help="Rastergröße in Pixeln")
+    parser.add_argument("--shift", type=float, nargs=2, default=[3.0, -1.0], help="Verschiebung pro 10 min")
+    parser.add_argument("--frames", type=int, default=4)
+    parser.add_argument("--max-shift", type=int, default=8)
+    args = parser.parse_args()
+
+    r = _selftest(args.size, tuple(args.shift), args.frames, args.max_shift)
+    print(f"Soll {args.shift[0]:+.2f}/{args.shift[1]:+.2f} px je 10 min → "
+          f"geschätzt {r['vx']:+.2f}/{r['vy']:+.2f} ({r['pairs']} Paare, {r['seconds']:.3f} s)")
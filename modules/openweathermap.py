@@ -1,18 +1,43 @@
-import requests
+import json
+import threading
+from pathlib import Path
+from typing import Optional
 
-def get_openweathermap(cfg: dict) -> dict:
-    api_key = cfg.get("openweathermap_api_key")
-    if not api_key:
-        return {"error": "API key fehlt in der Konfiguration!"}
+from modules import persist
+from modules.deadline import Deadline
+
+# Gruppierte Abfragen: Standorte mit derselben Stadt teilen sich pro Lauf einen
+# einzigen API-Call (thread-safe, pro Stadt gesperrt).
+_CACHE: dict = {}
+_LOCKS: dict = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _last_path(cfg: dict) -> Path:
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    return base_dir / "json" / "openweathermap" / "last.json"
+
+
+def _load_last(cfg: dict) -> Optional[dict]:
+    p = _last_path(cfg)
+    if persist.exists(p):
+        try:
+            return json.loads(persist.read_text(p))
+        except Exception:
+            pass
+    return None
+
+
+def _fetch(api_key: str, city: str, timeout: float = 10) -> dict:
+    import requests  # erst hier: Läufe, die nicht fällig sind oder Altdaten nutzen, sparen den Import
 
-    city = cfg.get("city", "Laufamholz,de")
     url = (
         "http://api.openweathermap.org/data/2.5/weather"
         f"?q={city}&appid={api_key}&units=metric"
     )
 
     try:
-        resp = requests.get(url, timeout=10)
+        resp = requests.get(url, timeout=timeout)
         if resp.status_code != 200:
             return {"error": f"API request failed: {resp.text}"}
         return resp.json()
@@ -20,3 +45,48 @@ def get_openweathermap(cfg: dict) -> dict:
         return {"error": "OpenWeatherMap API not available at this timepoint (timeout)"}
     except requests.RequestException as e:
         return {"error": f"OpenWeatherMap API not available at this timepoint ({e})"}
+
+
+def get_openweathermap(cfg: dict, deadline: Optional[Deadline] = None) -> dict:
+    """
+    Aktuelles Wetter für cfg["city"]. Mit deadline: Timeout auf die Restzeit begrenzt;
+    reicht sie nicht (oder läuft der Call in den Timeout), werden die letzten Daten
+    wiederverwendet und die Stufe als degradiert vermerkt.
+    """
+    api_key = cfg.get("openweathermap_api_key")
+    if not api_key:
+        return {"error": "API key fehlt in der Konfiguration!"}
+
+    if deadline is not None and not deadline.allows("owm"):
+        last = _load_last(cfg)
+        if last is not None:
+            deadline.degrade("owm", "last data")
+            return last
+
+    city = cfg.get("city", "Laufamholz,de")
+    key = (api_key, city.strip().lower())
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _CACHE:
+            timeout = deadline.timeout(10) if deadline is not None else 10
+            _CACHE[key] = _fetch(api_key, city, timeout=timeout)
+        # Kopie: Aufrufer dürfen ihr Ergebnis nicht gegenseitig verändern
+        owm = dict(_CACHE[key])
+
+    if "error" in owm:
+        if deadline is not None and ("(timeout)" in owm["error"] or deadline.expired()):
+            last = _load_last(cfg)
+            if last is not None:
+                deadline.degrade("owm", "last data after timeout")
+                return last
+        return owm
+
+    persist.write_text(_last_path(cfg), json.dumps(owm))
+    return owm
+
+
+def clear_cache() -> None:
+    with _LOCKS_GUARD:
+        _CACHE.clear()
+        _LOCKS.clear()
@@ -0,0 +1,221 @@
+import datetime
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# SD-Karten-schonende Persistenz:
+#   - Heiße Zustände (storm/scene/schedule/rain/nowcast) und der Radar-Cache – also was
+#     jeden Zyklus neu geschrieben wird – werden in einem RAM-Verzeichnis (tmpfs, z. B.
+#     /dev/shm) gestaged.
+#   - Archiv-JSONs (json/*.json, classified/) entstehen einmal und werden nie überschrieben:
+#     Staging spart dort nichts, würde aber bei Stromausfall bis zu flush_interval an Daten
+#     kosten → write_durable() schreibt sie sofort auf die Karte.
+#   - flush() schreibt sie gebündelt auf die Karte – alle flush_interval Sekunden,
+#     jede Datei per write-temp → fsync → rename (atomar, nie halb geschrieben).
+#   - Ohne Staging (Standard) schreibt write_*() direkt, aber ebenfalls atomar.
+# Der Zustand zwischen Cron-Läufen liegt im Staging-Verzeichnis selbst (_pending.json).
+
+_TMP_SUFFIX = ".persist-tmp"
+
+_LOCK = threading.RLock()
+_CFG: Dict[str, Any] = {"enabled": False}
+
+
+def _get_defaults(cfg):
+    p = cfg.get("persist", {})
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    return {
+        "enabled": bool(p.get("enabled", False)),
+        "staging_dir": Path(p.get("staging_dir", "/dev/shm/raspberry-cam")),
+        "flush_interval": float(p.get("flush_interval", 1800)),
+        "stats_file": Path(p.get("stats_file", base_dir / "json" / "persist" / "stats.json")),
+        "recover_dirs": _recover_dirs(base_dir, cfg),
+    }
+
+
+def _recover_dirs(base_dir: Path, cfg: Dict[str, Any]) -> List[Path]:
+    """json/ und jpg/cache/ aller Standorte (mit "sites" unter sites/<name>/)."""
+    from modules import sites  # sites importiert persist
+
+    try:
+        bases = [site_base for _, site_base, _ in sites.site_configs(base_dir, cfg)]
+    except ValueError:
+        bases = [base_dir]     # fehlerhafte Standortliste: main meldet das selbst
+    return [d for b in bases for d in (b / "json", b / "jpg" / "cache")]
+
+
+def configure(cfg: Dict[str, Any]) -> None:
+    """Einmal pro Prozess aufrufen (main); danach nutzen alle Module dieselbe Einstellung."""
+    global _CFG
+    with _LOCK:
+        _CFG = _get_defaults(cfg)
+        if _CFG["enabled"]:
+            _CFG["staging_dir"].mkdir(parents=True, exist_ok=True)
+
+
+def staging_dir() -> Optional[Path]:
+    """RAM-Verzeichnis für flüchtige Dateien (jpg/current), None ohne Staging."""
+    return _CFG["staging_dir"] if _CFG.get("enabled") else None
+
+
+def _staged(path: Path) -> Path:
+    return _CFG["staging_dir"] / "files" / str(Path(path).resolve()).lstrip("/")
+
+
+def _meta_path() -> Path:
+    return _CFG["staging_dir"] / "_pending.json"
+
+
+def _load_meta() -> Dict[str, Any]:
+    try:
+        return json.loads(_meta_path().read_text(encoding="utf-8"))
+    except Exception:
+        return {"pending": [], "last_flush": time.time(), "days": {}}
+
+
+def _save_meta(meta: Dict[str, Any]) -> None:
+    _atomic_write(_meta_path(), json.dumps(meta).encode("utf-8"), sync=False)
+
+
+def _count(meta: Dict[str, Any], key: str, n: int) -> None:
+    day = datetime.date.today().isoformat()
+    d = meta.setdefault("days", {}).setdefault(day, {"logical_bytes": 0, "card_bytes": 0})
+    d[key] = int(d.get(key, 0)) + n
+
+
+def _atomic_write(path: Path, data: bytes, *, sync: bool = True) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}{_TMP_SUFFIX}")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+# ============================ Öffentliche API ============================
+
+def write_bytes(path: Path, data: bytes) -> None:
+    path = Path(path)
+    with _LOCK:
+        if not _CFG.get("enabled"):
+            _atomic_write(path, data)
+            return
+        _atomic_write(_staged(path), data, sync=False)
+        meta = _load_meta()
+        key = str(path.resolve())
+        if key not in meta["pending"]:
+            meta["pending"].append(key)
+        _count(meta, "logical_bytes", len(data))
+        _save_meta(meta)
+
+
+def write_text(path: Path, text: str, encoding: str = "utf-8") -> None:
+    write_bytes(path, text.encode(encoding))
+
+
+def write_durable(path: Path, data: bytes) -> None:
+    """Einmal geschriebene Archivdatei: sofort atomar auf die Karte, nie gestaged."""
+    _atomic_write(Path(path), data)
+
+
+def write_transient(path: Path, data: bytes) -> None:
+    """Flüchtige Datei (liegt ohnehin im RAM oder wird jeden Zyklus ersetzt): nur atomar, nie gestaged."""
+    _atomic_write(Path(path), data, sync=False)
+
+
+def read_bytes(path: Path) -> bytes:
+    """Liest die gestagte Version, falls vorhanden, sonst die Datei auf der Karte."""
+    path = Path(path)
+    if _CFG.get("enabled"):
+        staged = _staged(path)
+        if staged.exists():
+            return staged.read_bytes()
+    return path.read_bytes()
+
+
+def read_text(path: Path, encoding: str = "utf-8") -> str:
+    return read_bytes(path).decode(encoding)
+
+
+def exists(path: Path) -> bool:
+    path = Path(path)
+    return (_CFG.get("enabled") and _staged(path).exists()) or path.exists()
+
+
+def flush(force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Schreibt alle gestagten Dateien gebündelt auf die Karte, sobald flush_interval
+    abgelaufen ist (oder force). Gibt eine kleine Statistik zurück, None ohne Flush.
+    """
+    if not _CFG.get("enabled"):
+        return None
+    with _LOCK:
+        meta = _load_meta()
+        now = time.time()
+        if not force and now - float(meta.get("last_flush", 0.0)) < _CFG["flush_interval"]:
+            return None
+
+        written = 0
+        dirs = set()
+        for key in meta["pending"]:
+            target = Path(key)
+            staged = _staged(target)
+            if not staged.exists():
+                continue
+            data = staged.read_bytes()
+            _atomic_write(target, data)
+            dirs.add(target.parent)
+            written += len(data)
+            staged.unlink()
+        for d in dirs:
+            _fsync_dir(d)
+
+        files = len(meta["pending"])
+        _count(meta, "card_bytes", written)
+        meta["pending"] = []
+        meta["last_flush"] = now
+        _save_meta(meta)
+
+        # Statistik (Bytes pro Tag: logisch vs. tatsächlich auf der Karte) direkt mitschreiben
+        days = dict(sorted(meta.get("days", {}).items())[-60:])
+        _atomic_write(_CFG["stats_file"], json.dumps(days, indent=2).encode("utf-8"))
+
+    print(f"💾 Persist-Flush: {files} Dateien, {written} B auf die Karte")
+    return {"files": files, "bytes": written}
+
+
+def recover() -> None:
+    """
+    Beim Start: halb geschriebene Temp-Dateien eines abgebrochenen Schreibvorgangs
+    (z. B. Stromausfall während des Flushs) entfernen. Die Zieldateien selbst sind
+    dank rename immer vollständig – alter oder neuer Stand.
+    Liegen nach einem Absturz ohne Reboot noch gestagte Dateien vor, bleiben sie
+    vorgemerkt und gehen mit dem nächsten Flush raus.
+    """
+    with _LOCK:
+        for root in _CFG.get("recover_dirs", []):
+            if root.exists():
+                for tmp in root.rglob(f".*{_TMP_SUFFIX}"):
+                    tmp.unlink(missing_ok=True)
+
+        if not _CFG.get("enabled"):
+            return
+        meta = _load_meta()
+        meta["pending"] = [k for k in meta["pending"] if _staged(Path(k)).exists()]
+        _save_meta(meta)
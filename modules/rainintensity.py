@@ -3,8 +3,12 @@
 
 from __future__ import annotations
 
+import gc
 import io
 import json
+import math
+import resource
+import threading
 import time
 from pathlib import Path
 from typing import List, Tuple, Optional
@@ -12,11 +16,15 @@ from typing import List, Tuple, Optional
 import requests
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
+from modules import persist
+from modules.deadline import Deadline
+
 # ============================ Basis-Setup ============================
 
 # Nürnberg-Ausschnitt: Tile-Koordinaten (x, y) bei Zoom 6 (2×2)
 DEFAULT_TILES: List[Tuple[int, int]] = [(33, 21), (34, 21), (33, 22), (34, 22)]
 TILE_SIZE = 256
+MAX_LAT = 85.05112878  # Grenze der Web-Mercator-Projektion
 
 CARTO_BASE = "https://basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png"
 RAINVIEWER_API = "https://api.rainviewer.com/public/weather-maps.json"
@@ -40,34 +48,82 @@ def _get_session(cfg: dict) -> requests.Session:
 
 
 def _http_get(session: requests.Session, url: str, *, connect_timeout: float = 3.0,
-              read_timeout: float = 8.0, tries: int = 3) -> requests.Response:
+              read_timeout: float = 8.0, tries: int = 3,
+              deadline: Optional[Deadline] = None) -> requests.Response:
     """
     GET mit einfachem Exponential-Backoff.
+    Mit deadline: Timeouts auf die Restzeit begrenzt, kein Retry-Sleep über das Budget hinaus.
     """
     last_exc = None
     for i in range(max(1, tries)):
+        if deadline is not None:
+            if deadline.expired():
+                raise TimeoutError(f"Zyklus-Deadline erreicht vor GET {url}")
+            timeout = (deadline.timeout(connect_timeout), deadline.timeout(read_timeout))
+        else:
+            timeout = (connect_timeout, read_timeout)
         try:
-            r = session.get(url, timeout=(connect_timeout, read_timeout))
+            r = session.get(url, timeout=timeout)
             r.raise_for_status()
             return r
         except Exception as e:
             last_exc = e
-            if i == tries - 1:
+            pause = 0.5 * (2 ** i)
+            if i == tries - 1 or (deadline is not None and deadline.remaining() <= pause):
                 raise
-            time.sleep(0.5 * (2 ** i))
+            time.sleep(pause)
     # sollte nie hier landen
     raise last_exc  # type: ignore[misc]
 
 
-def _fetch_json(session: requests.Session, url: str, *, read_timeout: float) -> dict:
-    r = _http_get(session, url, read_timeout=read_timeout)
-    return r.json()
+# ============================ Geteilter Tile-Cache ============================
+# Prozessweit, thread-safe: mehrere Standorte mit überlappenden Ausschnitten
+# holen jede URL nur einmal pro Lauf. Gespeichert werden die Rohbytes (PNG),
+# jeder Aufrufer dekodiert sein eigenes Image → keine geteilten, mutierbaren Objekte.
+
+_TILE_CACHE: dict[str, bytes] = {}
+_TILE_LOCKS: dict[str, threading.Lock] = {}
+_TILE_LOCKS_GUARD = threading.Lock()
+_TILE_STATS = {"hits": 0, "misses": 0}
+
+
+def _cached_get(session: requests.Session, url: str, *, read_timeout: float, tries: int,
+                deadline: Optional[Deadline] = None) -> bytes:
+    with _TILE_LOCKS_GUARD:
+        lock = _TILE_LOCKS.setdefault(url, threading.Lock())
+    # Pro URL gesperrt: parallele Anfragen auf dieselbe Kachel warten auf den ersten Download
+    with lock:
+        data = _TILE_CACHE.get(url)
+        if data is not None:
+            _TILE_STATS["hits"] += 1
+            return data
+        r = _http_get(session, url, read_timeout=read_timeout, tries=tries, deadline=deadline)
+        _TILE_CACHE[url] = r.content
+        _TILE_STATS["misses"] += 1
+        return r.content
+
+
+def clear_tile_cache() -> None:
+    """Leert den geteilten Cache (z. B. zu Beginn jedes Laufs in einem Dauerprozess)."""
+    with _TILE_LOCKS_GUARD:
+        _TILE_CACHE.clear()
+        _TILE_LOCKS.clear()
+        _TILE_STATS.update(hits=0, misses=0)
+
+
+def tile_cache_stats() -> dict:
+    return dict(_TILE_STATS, entries=len(_TILE_CACHE))
+
+
+def _fetch_json(session: requests.Session, url: str, *, read_timeout: float,
+                deadline: Optional[Deadline] = None) -> dict:
+    return json.loads(_cached_get(session, url, read_timeout=read_timeout, tries=3, deadline=deadline))
 
 
 def _download_png(session: requests.Session, url: str, *, read_timeout: float,
-                  retries: int) -> Image.Image:
-    r = _http_get(session, url, read_timeout=read_timeout, tries=retries + 1)
-    return Image.open(io.BytesIO(r.content)).convert("RGBA")
+                  retries: int, deadline: Optional[Deadline] = None) -> Image.Image:
+    data = _cached_get(session, url, read_timeout=read_timeout, tries=retries + 1, deadline=deadline)
+    return Image.open(io.BytesIO(data)).convert("RGBA")
 
 
 # ============================ Bild-Helfer ============================
@@ -85,13 +141,47 @@ def _sanitize_text(s: str) -> str:
 
 
 def _alpha_apply(im: Image.Image, opacity: float) -> Image.Image:
+    """Skaliert den Alphakanal in place (kein split/merge mit vier Kanal-Kopien)."""
     if opacity >= 1.0:
         return im
     if opacity <= 0.0:
         return Image.new("RGBA", im.size, (0, 0, 0, 0))
-    r, g, b, a = im.split()
-    a = a.point(lambda px: int(px * opacity))
-    return Image.merge("RGBA", (r, g, b, a))
+    im.putalpha(im.getchannel("A").point([int(px * opacity) for px in range(256)]))
+    return im
+
+
+# ============================ Speicher-Budget ============================
+
+def _rss_mb() -> float:
+    """Aktueller RSS in MB (Linux /proc), sonst Peak laut getrusage."""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except Exception:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _check_rss(max_rss_mb: Optional[float], stage: str) -> None:
+    """
+    Prüft das RSS-Budget *nach* einer Render-Stufe: erst gc, dann MemoryError.
+    Begrenzt den Speicher nicht, sondern bricht ab, wenn er schon zu hoch ist –
+    der Aufrufer behält dann das Bild ohne Radar. Begrenzt wird durch low_memory.
+    """
+    if not max_rss_mb:
+        return
+    if _rss_mb() > max_rss_mb:
+        gc.collect()
+        rss = _rss_mb()
+        if rss > max_rss_mb:
+            raise MemoryError(f"RSS {rss:.0f} MB > Budget {max_rss_mb:.0f} MB nach '{stage}'")
+
+
+def peak_rss_mb() -> float:
+    """Peak-RSS des Prozesses in MB (für Messungen/Benchmarks)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
 
 
 def _grid_cols_rows(n: int) -> tuple[int, int]:
@@ -106,42 +196,126 @@ def _grid_cols_rows(n: int) -> tuple[int, int]:
     return cols, rows
 
 
+# ============================ Viewport → Tiles ============================
+
+def _lonlat_to_px(lat: float, lon: float, zoom: int) -> tuple[float, float]:
+    """Globale Web-Mercator-Pixelkoordinaten bei gegebenem Zoom."""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    world = TILE_SIZE * (2 ** zoom)
+    x = (lon + 180.0) / 360.0 * world
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * world
+    return x, y
+
+
+def viewport_tiles(
+    zoom: int,
+    *,
+    center: Optional[Tuple[float, float]] = None,
+    size: Optional[Tuple[int, int]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> tuple[List[Tuple[int, int]], int, Tuple[int, int, int, int]]:
+    """
+    Minimale Tile-Menge für einen Ausschnitt – entweder center=(lat, lon) + size=(w, h) in Pixeln
+    oder bbox=(süd, west, nord, ost) in Grad.
+    Returns: (tiles zeilenweise, cols, crop_box relativ zur zusammengesetzten Tile-Fläche)
+    """
+    if bbox is not None:
+        south, west, north, east = bbox
+        x0, y0 = _lonlat_to_px(north, west, zoom)
+        x1, y1 = _lonlat_to_px(south, east, zoom)
+        px0, py0 = math.floor(x0), math.floor(y0)
+        px1, py1 = math.ceil(x1), math.ceil(y1)
+    elif center is not None and size is not None:
+        cx, cy = _lonlat_to_px(center[0], center[1], zoom)
+        w, h = int(size[0]), int(size[1])
+        px0, py0 = int(round(cx - w / 2)), int(round(cy - h / 2))
+        px1, py1 = px0 + w, py0 + h
+    else:
+        raise ValueError("viewport_tiles braucht bbox oder center + size")
+
+    world = TILE_SIZE * (2 ** zoom)
+    if px1 <= px0 or py1 <= py0:
+        raise ValueError("Leerer Viewport")
+    if py0 < 0 or py1 > world:
+        raise ValueError("Viewport reicht über den Kartenrand (Nord/Süd)")
+
+    tx0, ty0 = px0 // TILE_SIZE, py0 // TILE_SIZE
+    tx1, ty1 = (px1 - 1) // TILE_SIZE, (py1 - 1) // TILE_SIZE
+    n = 2 ** zoom
+    # x wird modulo n gewickelt (Datumsgrenze), y ist oben geprüft
+    tiles = [(tx % n, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+    cols = tx1 - tx0 + 1
+
+    left, top = px0 - tx0 * TILE_SIZE, py0 - ty0 * TILE_SIZE
+    crop_box = (left, top, left + (px1 - px0), top + (py1 - py0))
+    return tiles, cols, crop_box
+
+
 # ============================ Basemap (mit Cache) ============================
 
+def _layout(tiles: List[Tuple[int, int]], cols: Optional[int]) -> tuple[int, int]:
+    if cols is None:
+        return _grid_cols_rows(len(tiles))
+    return cols, (len(tiles) + cols - 1) // cols
+
+
 def _compose_basemap(session: requests.Session, tiles: List[Tuple[int, int]], *, zoom: int,
-                     read_timeout: float, retries: int) -> Image.Image:
-    cols, rows = _grid_cols_rows(len(tiles))
-    canvas = Image.new("RGBA", (cols * TILE_SIZE, rows * TILE_SIZE), (0, 0, 0, 255))
+                     read_timeout: float, retries: int, cols: Optional[int] = None,
+                     crop_box: Optional[Tuple[int, int, int, int]] = None,
+                     deadline: Optional[Deadline] = None) -> Image.Image:
+    cols, rows = _layout(tiles, cols)
+    # Direkt in Ausschnittsgröße zeichnen (paste beschneidet negative Offsets) –
+    # kein Vollkachel-Canvas plus Crop-Kopie
+    x0, y0, x1, y1 = crop_box or (0, 0, cols * TILE_SIZE, rows * TILE_SIZE)
+    canvas = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 255))
     for idx, (x, y) in enumerate(tiles):
         row, col = divmod(idx, cols)
         base_url = CARTO_BASE.format(z=zoom, x=x, y=y)
-        base_im = _download_png(session, base_url, read_timeout=read_timeout, retries=retries)
-        canvas.paste(base_im, (col * TILE_SIZE, row * TILE_SIZE))
+        base_im = _download_png(session, base_url, read_timeout=read_timeout, retries=retries,
+                                deadline=deadline)
+        canvas.paste(base_im, (col * TILE_SIZE - x0, row * TILE_SIZE - y0))
     return canvas
 
 
 def _load_or_build_basemap(session: requests.Session, *, basemap_image_cache_path: str,
                            tiles: List[Tuple[int, int]], zoom: int,
-                           read_timeout: float, retries: int) -> Image.Image:
+                           read_timeout: float, retries: int, cols: Optional[int] = None,
+                           crop_box: Optional[Tuple[int, int, int, int]] = None,
+                           deadline: Optional[Deadline] = None) -> Image.Image:
     """
     Lädt Basemap aus Cache (PNG) oder baut sie aus Tiles und cached sie.
+    Der Cache gilt nur für denselben Ausschnitt (Schlüssel im JSON daneben).
     """
     p = Path(basemap_image_cache_path)
+    meta = p.with_suffix(".json")
+    key = {"tiles": [list(t) for t in tiles], "zoom": zoom, "cols": cols,
+           "crop_box": list(crop_box) if crop_box else None}
     if p.exists():
         try:
-            return Image.open(p).convert("RGBA")
+            if meta.exists():
+                fresh = json.loads(meta.read_text()) == key
+            else:
+                # Alte Caches ohne Schlüssel gelten nur für das feste Tile-Layout (ohne
+                # center/viewport/bbox) und nur, wenn die Bildgröße dazu passt
+                n_cols, n_rows = _layout(tiles, cols)
+                fresh = crop_box is None and Image.open(p).size == (n_cols * TILE_SIZE, n_rows * TILE_SIZE)
+            if fresh:
+                return Image.open(p).convert("RGBA")
         except Exception:
             pass  # defekt → neu bauen
-    base = _compose_basemap(session, tiles, zoom=zoom, read_timeout=read_timeout, retries=retries)
+    base = _compose_basemap(session, tiles, zoom=zoom, read_timeout=read_timeout, retries=retries,
+                            cols=cols, crop_box=crop_box, deadline=deadline)
     p.parent.mkdir(parents=True, exist_ok=True)
     base.save(p, "PNG", optimize=True)
+    meta.write_text(json.dumps(key))
     return base
 
 
 # ============================ Radar (Tiles + Cache) ============================
 
-def _get_latest_radar_meta(session: requests.Session, *, read_timeout: float) -> tuple[str, str, int]:
-    data = _fetch_json(session, RAINVIEWER_API, read_timeout=read_timeout)
+def _get_latest_radar_meta(session: requests.Session, *, read_timeout: float,
+                           deadline: Optional[Deadline] = None) -> tuple[str, str, int]:
+    data = _fetch_json(session, RAINVIEWER_API, read_timeout=read_timeout, deadline=deadline)
     host = data.get("host") or "https://tilecache.rainviewer.com"
     past = (data.get("radar") or {}).get("past") or []
     if not past:
@@ -153,39 +327,69 @@ def _get_latest_radar_meta(session: requests.Session, *, read_timeout: float) ->
 def _compose_radar_overlay(session: requests.Session, tiles: List[Tuple[int, int]], *,
                            zoom: int, host: str, rv_path: str,
                            palette: int, smooth: int, snow: int,
-                           read_timeout: float, retries: int, opacity: float) -> Image.Image:
-    cols, rows = _grid_cols_rows(len(tiles))
-    overlay = Image.new("RGBA", (cols * TILE_SIZE, rows * TILE_SIZE), (0, 0, 0, 0))
+                           read_timeout: float, retries: int, opacity: float,
+                           cols: Optional[int] = None,
+                           crop_box: Optional[Tuple[int, int, int, int]] = None,
+                           deadline: Optional[Deadline] = None) -> Image.Image:
+    cols, rows = _layout(tiles, cols)
+    # Kacheln überlappen nicht: paste auf transparenten Grund == alpha_composite,
+    # erlaubt aber negative Offsets → direkt in Ausschnittsgröße
+    x0, y0, x1, y1 = crop_box or (0, 0, cols * TILE_SIZE, rows * TILE_SIZE)
+    overlay = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
     for idx, (x, y) in enumerate(tiles):
         row, col = divmod(idx, cols)
         rv_url = f"{host}{rv_path}/256/{zoom}/{x}/{y}/{palette}/{smooth}_{snow}.png"
-        rv_im = _download_png(session, rv_url, read_timeout=read_timeout, retries=retries)
-        overlay.alpha_composite(_alpha_apply(rv_im, opacity), (col * TILE_SIZE, row * TILE_SIZE))
+        rv_im = _download_png(session, rv_url, read_timeout=read_timeout, retries=retries,
+                              deadline=deadline)
+        overlay.paste(_alpha_apply(rv_im, opacity), (col * TILE_SIZE - x0, row * TILE_SIZE - y0))
     return overlay
 
 
-def _save_radar_cache(cache_png: Path, overlay: Image.Image, epoch: Optional[int]) -> None:
+def _save_radar_cache(cache_png: Path, overlay: Image.Image, epoch: Optional[int], *,
+                      zoom: Optional[int] = None, origin: Optional[Tuple[int, int]] = None) -> None:
+    """
+    origin = globale Web-Mercator-Pixelkoordinate der linken oberen Overlay-Ecke –
+    damit kann rainrate.py Orte im Overlay wiederfinden.
+    """
     try:
-        cache_png.parent.mkdir(parents=True, exist_ok=True)
-        overlay.save(cache_png, "PNG", optimize=True)
+        buf = io.BytesIO()
+        overlay.save(buf, "PNG", optimize=True)
+        persist.write_bytes(cache_png, buf.getvalue())
         if epoch is not None:
-            cache_png.with_suffix(".json").write_text(json.dumps({"epoch": int(epoch)}))
+            meta = {"epoch": int(epoch), "zoom": zoom, "origin": list(origin) if origin else None}
+            persist.write_text(cache_png.with_suffix(".json"), json.dumps(meta))
     except Exception:
         pass  # Best-effort
 
 
-def _load_radar_cache(cache_png: Path) -> tuple[Optional[Image.Image], Optional[int]]:
+def _load_radar_cache(cache_png: Path, *, zoom: Optional[int] = None, origin: Optional[Tuple[int, int]] = None,
+                      explicit: bool = False) -> tuple[Optional[Image.Image], Optional[int]]:
+    """
+    Letztes gutes Overlay samt Epoche. Mit zoom/origin nur, wenn der Cache denselben
+    Ausschnitt zeigt (Meta von _save_radar_cache). Caches ohne diese Angaben gelten – wie
+    bei der Basemap – nur für das feste Tile-Layout (explicit=False).
+    """
     try:
-        if not cache_png.exists():
+        if not persist.exists(cache_png):
             return None, None
-        overlay = Image.open(cache_png).convert("RGBA")
-        epoch = None
-        meta = cache_png.with_suffix(".json")
-        if meta.exists():
+        meta = {}
+        meta_path = cache_png.with_suffix(".json")
+        if persist.exists(meta_path):
             try:
-                epoch = int(json.loads(meta.read_text()).get("epoch"))
+                meta = json.loads(persist.read_text(meta_path))
             except Exception:
-                epoch = None
+                meta = {}
+        if origin is not None:
+            if meta.get("origin") is None:
+                if explicit:
+                    return None, None
+            elif meta.get("zoom") != zoom or tuple(meta["origin"]) != tuple(origin):
+                return None, None   # anderer Ausschnitt (z. B. center verschoben)
+        overlay = Image.open(io.BytesIO(persist.read_bytes(cache_png))).convert("RGBA")
+        try:
+            epoch = int(meta["epoch"]) if meta.get("epoch") is not None else None
+        except (TypeError, ValueError):
+            epoch = None
         return overlay, epoch
     except Exception:
         return None, None
@@ -324,6 +528,165 @@ def _add_bottom_footer_exact(
     return out
 
 
+# ============================ Panel (Standard) ============================
+
+def _compose_panel(
+    radar: Image.Image,
+    *,
+    border_width: int,
+    border_color: str,
+    header_title: str,
+    radar_epoch: Optional[int],
+    timestamp_fmt: str,
+    attribution_text: Optional[str],
+    legend: bool,
+    legend_width: int,
+    legend_padding: int,
+) -> Image.Image:
+    """Border → Header → Footer → Legende um das Radar in voller Auflösung."""
+    # 5) Border NUR ums Radar
+    if border_width > 0:
+        try:
+            radar = ImageOps.expand(radar, border=border_width, fill=border_color)
+        except Exception:
+            radar = ImageOps.expand(radar, border=border_width, fill="#808080")
+
+    # 6) Header & Footer NUR über/unter Radar
+    radar = _add_top_header_exact(
+        radar,
+        title=header_title,
+        radar_epoch=radar_epoch,
+        timestamp_fmt=timestamp_fmt,
+        pad_x=8,
+        pad_y=6,
+        text_color="#DCDCDC",
+        bg_color=(60, 60, 60, 200),
+    )
+    radar = _add_bottom_footer_exact(
+        radar,
+        txt=attribution_text,
+        pad_x=8,
+        pad_y=4,
+        text_color="#D0D0D0",
+        bg_color=(0, 0, 0, 100),
+    )
+
+    # 7) Legende rechts bündig anfügen (Höhe = aktuell inkl. Header/Footer)
+    if legend:
+        lg = _make_legend(radar.height, width=legend_width, padding=legend_padding)
+        combined = Image.new("RGBA", (radar.width + lg.width, radar.height), (0, 0, 0, 0))
+        combined.paste(radar, (0, 0))
+        combined.paste(lg, (radar.width, 0), lg)
+        radar = combined
+    return radar
+
+
+# ============================ Low-Memory: Panel in einem Canvas ============================
+
+def _text_height(txt: str, font, minimum: int) -> int:
+    dummy = ImageDraw.Draw(Image.new("RGBA", (10, 10)))
+    _, _, _, text_h = dummy.textbbox((0, 0), txt, font=font)
+    return max(text_h, minimum)
+
+
+def _inset_size(panel_w: int, panel_h: int, overlay_size: Tuple[int, Optional[int]]) -> Tuple[int, int]:
+    """Zielgröße im Hintergrundbild; Höhe None → aus dem Seitenverhältnis des Panels."""
+    w, h = overlay_size
+    return int(w), int(h) if h else max(1, round(panel_h * w / panel_w))
+
+
+def _panel_text(header_title: str, radar_epoch: Optional[int], timestamp_fmt: str,
+                attribution_text: Optional[str]):
+    """Schrift, Header-/Footer-Text und deren Höhen – wie in _add_top_header_exact/_add_bottom_footer."""
+    try:
+        font = ImageFont.load_default()
+    except Exception:
+        font = None
+    ts = time.strftime(timestamp_fmt, time.localtime(radar_epoch)) if radar_epoch is not None else ""
+    header_txt = _sanitize_text(f"{header_title} | {ts}" if ts else header_title)
+    header_h = 6 + _text_height(header_txt, font, 12) + 6
+    footer_txt = _sanitize_text(attribution_text) if attribution_text else None
+    footer_h = (4 + _text_height(footer_txt, font, 10) + 4) if footer_txt else 0
+    return font, header_txt, header_h, footer_txt, footer_h
+
+
+def _lowmem_radar_size(radar_size: Tuple[int, int], overlay_size: Tuple[int, Optional[int]],
+                       deco_w: int, deco_h: int) -> Tuple[int, int]:
+    """Radar-Größe, mit der das fertige Panel (inkl. Rahmen, Header, Footer, Legende) overlay_size hat."""
+    target_w = max(1, int(overlay_size[0]) - deco_w)
+    if overlay_size[1]:
+        target_h = max(1, int(overlay_size[1]) - deco_h)
+    else:
+        target_h = max(1, round(radar_size[1] * target_w / radar_size[0]))
+    return target_w, target_h
+
+
+def _compose_panel_lowmem(
+    radar: Image.Image,
+    *,
+    border_width: int,
+    border_color: str,
+    header_title: str,
+    radar_epoch: Optional[int],
+    timestamp_fmt: str,
+    attribution_text: Optional[str],
+    legend: bool,
+    legend_width: int,
+    legend_padding: int,
+    overlay_size: Optional[Tuple[int, Optional[int]]] = None,
+) -> Image.Image:
+    """
+    Wie Border → Header → Footer → Legende, aber alle Maße vorab berechnet und in
+    *einen* Canvas gezeichnet – statt vier aufeinanderfolgender Vollbild-Kopien.
+    Mit overlay_size wird das Radar zuerst auf Zielauflösung verkleinert, sodass das
+    fertige Panel genau die Einbettungsgröße hat (Schrift in nativer Größe).
+    Header/Footer/Legende werden wie im Normalpfad geblendet (gleiche Farben).
+    """
+    font, header_txt, header_h, footer_txt, footer_h = _panel_text(
+        header_title, radar_epoch, timestamp_fmt, attribution_text)
+    bw = border_width
+    lg_w = max(20, legend_width) if legend else 0
+
+    if overlay_size is not None:
+        # Früh auf Zielauflösung: alle weiteren Schritte arbeiten nur noch auf Inset-Größe
+        target = _lowmem_radar_size(radar.size, overlay_size,
+                                    2 * bw + lg_w, header_h + footer_h + 2 * bw)
+        if target != radar.size:
+            radar = radar.resize(target, Image.LANCZOS)
+
+    map_w, map_h = radar.width + 2 * bw, radar.height + 2 * bw
+    canvas = Image.new("RGBA", (map_w + lg_w, header_h + map_h + footer_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(canvas)
+
+    if bw > 0:
+        try:
+            draw.rectangle([0, header_h, map_w - 1, header_h + map_h - 1], fill=border_color)
+        except Exception:
+            draw.rectangle([0, header_h, map_w - 1, header_h + map_h - 1], fill="#808080")
+    canvas.paste(radar, (bw, header_h + bw), radar)
+    del radar
+
+    # Header als kleines Bild wie _add_top_header_exact; der Normalpfad blendet ihn im
+    # Footer-Schritt ein zweites Mal mit seiner eigenen Alpha – hier nachgebildet
+    header = Image.new("RGBA", (map_w, header_h), (0, 0, 0, 0))
+    strip = Image.new("RGBA", (map_w, header_h), (60, 60, 60, 200))
+    header.paste(strip, (0, 0), strip)
+    ImageDraw.Draw(header).text((8, 6), header_txt, font=font, fill="#DCDCDC")
+    canvas.paste(header, (0, 0), header if footer_txt else None)
+    del header
+
+    if footer_txt:
+        strip = Image.new("RGBA", (map_w, footer_h), (0, 0, 0, 100))
+        canvas.paste(strip, (0, header_h + map_h), strip)
+        draw.text((8, header_h + map_h + 4), footer_txt, font=font, fill="#D0D0D0")
+    del strip
+
+    if legend:
+        lg = _make_legend(canvas.height, width=legend_width, padding=legend_padding)
+        canvas.paste(lg, (map_w, 0), lg)
+    return canvas
+
+
 # ============================ Öffentliche API ============================
 
 def generate(
@@ -338,11 +701,14 @@ def generate(
     # Karten-Setup
     tiles: List[Tuple[int, int]] = DEFAULT_TILES,
     zoom: int = 6,
+    center: Optional[Tuple[float, float]] = None,               # (lat, lon) – mit viewport
+    viewport: Optional[Tuple[int, int]] = None,                 # (Breite, Höhe) in Pixeln
+    bbox: Optional[Tuple[float, float, float, float]] = None,   # (süd, west, nord, ost)
     # Darstellung / Layout
     legend: bool = True,
     legend_width: int = 54,
     legend_padding: int = 8,
-    overlay_size: Tuple[int, int] = (400, 400),
+    overlay_size: Tuple[int, Optional[int]] = (400, 400),   # Höhe None → Seitenverhältnis
     margin_right: int = 20,
     margin_bottom: int = 20,
     crop_bottom: int = 0,
@@ -363,13 +729,34 @@ def generate(
     retries: int = 2,
     # Ausgabe
     jpg_quality: int = 92,
-) -> None:
+    # Speicher (kleine Pis)
+    low_memory: bool = False,
+    max_rss_mb: Optional[float] = None,
+    # Zeitbudget des Zyklus
+    deadline: Optional[Deadline] = None,
+) -> Optional[int]:
     """
     Erzeugt das Radar-Panel (Basemap + Radar), setzt **Header & Footer nur über/unter das Radar**,
     hängt rechts die **Farbleiste** bündig an, speichert ein **Radar-JPG** und bettet es **unten rechts**
     in das Hintergrundbild ein (optional mit Panel via BG, hier transparentes Rechteck nutzbar).
+    Mit center + viewport oder bbox wird die minimale Tile-Menge berechnet und exakt auf den
+    Ausschnitt beschnitten (tiles/crop_bottom werden dann ignoriert).
+    low_memory: Radar früh auf overlay_size verkleinern, Panel in einem Canvas, Zwischenbilder
+    sofort freigeben – das Radar-JPG hat dann Inset-Größe. max_rss_mb: Schutzschalter, kein
+    Begrenzer – liegt der RSS nach einer Stufe darüber, bricht das Rendering mit MemoryError ab
+    (aktiviert low_memory implizit).
+    deadline: begrenzt alle HTTP-Aufrufe; reicht die Restzeit nicht, wird das gecachte Radar genutzt.
+    Gibt die Radar-Epoche (Unix-Zeit des Frames) zurück, None wenn kein Radar verfügbar.
     """
     session = _get_session(cfg)
+    low_memory = low_memory or bool(max_rss_mb)
+
+    # 0) Ausschnitt → Tiles (nur was im Bild landet, wird geladen)
+    cols: Optional[int] = None
+    crop_box: Optional[Tuple[int, int, int, int]] = None
+    if bbox is not None or (center is not None and viewport is not None):
+        tiles, cols, crop_box = viewport_tiles(zoom, center=center, size=viewport, bbox=bbox)
+        crop_bottom = 0
 
     # 1) Basemap laden/erstellen (Cache)
     basemap = _load_or_build_basemap(
@@ -379,69 +766,103 @@ def generate(
         zoom=zoom,
         read_timeout=timeout,
         retries=retries,
+        cols=cols,
+        crop_box=crop_box,
+        deadline=deadline,
     )
+    base_size = basemap.size
+
+    target = src_box = None
+    if low_memory:
+        # Früh auf Zielauflösung: Basemap sofort verkleinern (crop_bottom über box statt
+        # Kopie), damit Basemap und Overlay nie gleichzeitig in voller Größe im Speicher liegen.
+        # Header-Höhe mit "jetzt" als Platzhalter – das Zeitformat hat feste Länge.
+        if 0 < crop_bottom < base_size[1]:
+            src_box = (0, 0, base_size[0], base_size[1] - crop_bottom)
+        _, _, header_h, _, footer_h = _panel_text(header_title, int(time.time()), timestamp_fmt, attribution_text)
+        bw = border_width if border else 0
+        lg_w = max(20, legend_width) if legend else 0
+        src_size = (src_box[2], src_box[3]) if src_box else base_size
+        target = _lowmem_radar_size(src_size, overlay_size, 2 * bw + lg_w, header_h + footer_h + 2 * bw)
+        basemap = basemap.resize(target, Image.LANCZOS, box=src_box)
+        gc.collect()
+        _check_rss(max_rss_mb, "basemap")
 
     # 2) Radar-Overlay laden; API → Cache, sonst Fallback aus Cache
     overlay = None
     rv_epoch: Optional[int] = None
     radar_cache_png = Path(radar_image_cache_path)
+    tx0, ty0 = tiles[0]
+    origin = (tx0 * TILE_SIZE + (crop_box[0] if crop_box else 0),
+              ty0 * TILE_SIZE + (crop_box[1] if crop_box else 0))
     try:
-        host, rv_path, rv_epoch_now = _get_latest_radar_meta(session, read_timeout=timeout)
+        if deadline is not None and not deadline.allows("radar"):
+            deadline.degrade("radar", "cached overlay")
+            raise TimeoutError("Restzeit zu knapp für Radar-Download")
+        host, rv_path, rv_epoch_now = _get_latest_radar_meta(session, read_timeout=timeout, deadline=deadline)
         overlay = _compose_radar_overlay(
             session, tiles,
             zoom=zoom, host=host, rv_path=rv_path,
             palette=palette, smooth=smooth, snow=snow,
             read_timeout=timeout, retries=retries, opacity=opacity,
+            cols=cols, crop_box=crop_box, deadline=deadline,
         )
         rv_epoch = rv_epoch_now
-        _save_radar_cache(radar_cache_png, overlay, rv_epoch)
-    except Exception:
-        overlay, cached_epoch = _load_radar_cache(radar_cache_png)
+        _save_radar_cache(radar_cache_png, overlay, rv_epoch, zoom=zoom, origin=origin)
+    except Exception as e:
+        if deadline is not None and deadline.expired():
+            deadline.degrade("radar", f"cached overlay after {type(e).__name__}")
+        overlay, cached_epoch = _load_radar_cache(radar_cache_png, zoom=zoom, origin=origin,
+                                                  explicit=crop_box is not None)
         rv_epoch = cached_epoch
-
-    # 3) Radar-Canvas zusammensetzen (Basemap + Overlay)
-    radar = basemap.copy()
+        if overlay is not None and overlay.size != base_size:
+            overlay, rv_epoch = None, None  # Cache stammt von anderem Ausschnitt
+    _check_rss(max_rss_mb, "radar")
+
+    # 3) Radar-Canvas zusammensetzen (Basemap + Overlay) – in place, die Basemap
+    #    ist ohnehin frisch geladen und wird danach nicht mehr gebraucht
+    if overlay is not None and target is not None:
+        overlay = overlay.resize(target, Image.LANCZOS, box=src_box)
+    radar = basemap
+    del basemap
     if overlay is not None:
         radar.alpha_composite(overlay)
+    del overlay
 
-    # 4) Unten beschneiden (vor Border/Headers)
-    if crop_bottom > 0 and crop_bottom < radar.height:
+    # 4) Unten beschneiden (vor Border/Headers; low_memory: schon beim Verkleinern)
+    if not low_memory and crop_bottom > 0 and crop_bottom < radar.height:
         radar = radar.crop((0, 0, radar.width, radar.height - crop_bottom))
 
-    # 5) Border NUR ums Radar
-    if border and border_width > 0:
-        try:
-            radar = ImageOps.expand(radar, border=border_width, fill=border_color)
-        except Exception:
-            radar = ImageOps.expand(radar, border=border_width, fill="#808080")
-
-    # 6) Header & Footer NUR über/unter Radar
-    radar = _add_top_header_exact(
-        radar,
-        title=header_title,
-        radar_epoch=rv_epoch,
-        timestamp_fmt=timestamp_fmt,
-        pad_x=8,
-        pad_y=6,
-        text_color="#DCDCDC",
-        bg_color=(60, 60, 60, 200),
-    )
-    radar = _add_bottom_footer_exact(
-        radar,
-        txt=attribution_text,
-        pad_x=8,
-        pad_y=4,
-        text_color="#D0D0D0",
-        bg_color=(0, 0, 0, 100),
-    )
-
-    # 7) Legende rechts bündig anfügen (Höhe = aktuell inkl. Header/Footer)
-    if legend:
-        lg = _make_legend(radar.height, width=legend_width, padding=legend_padding)
-        combined = Image.new("RGBA", (radar.width + lg.width, radar.height), (0, 0, 0, 0))
-        combined.paste(radar, (0, 0))
-        combined.paste(lg, (radar.width, 0), lg)
-        radar = combined
+    if low_memory:
+        # 5–7) Border, Header, Footer, Legende in einem einzigen Canvas
+        radar = _compose_panel_lowmem(
+            radar,
+            border_width=border_width if border else 0,
+            border_color=border_color,
+            header_title=header_title,
+            radar_epoch=rv_epoch,
+            timestamp_fmt=timestamp_fmt,
+            attribution_text=attribution_text,
+            legend=legend,
+            legend_width=legend_width,
+            legend_padding=legend_padding,
+            overlay_size=overlay_size,
+        )
+    else:
+        # 5–7) Border, Header/Footer, Legende nacheinander (Standard)
+        radar = _compose_panel(
+            radar,
+            border_width=border_width if border else 0,
+            border_color=border_color,
+            header_title=header_title,
+            radar_epoch=rv_epoch,
+            timestamp_fmt=timestamp_fmt,
+            attribution_text=attribution_text,
+            legend=legend,
+            legend_width=legend_width,
+            legend_padding=legend_padding,
+        )
+    _check_rss(max_rss_mb, "panel")
 
     # 8) Radar-JPG speichern
     out = Path(output_image_path)
@@ -449,11 +870,23 @@ def generate(
     radar.convert("RGB").save(out, "JPEG", quality=jpg_quality, optimize=True, progressive=True)
 
     # 9) In Hintergrundbild unten rechts einbetten
-    bg = Image.open(bg_image_path).convert("RGB")
-    fg = radar.resize(overlay_size, Image.LANCZOS).convert("RGBA")
-
-    x = max(0, bg.width - overlay_size[0] - margin_right)
-    y = max(0, bg.height - overlay_size[1] - margin_bottom)
+    inset = _inset_size(radar.width, radar.height, overlay_size)
+    fg = radar if radar.size == inset else radar.resize(inset, Image.LANCZOS)
+    if fg.mode != "RGBA":
+        fg = fg.convert("RGBA")
+    if low_memory:
+        # Panel vor dem Laden des Hintergrunds freigeben
+        del radar
+        gc.collect()
+
+    bg = Image.open(bg_image_path)
+    if bg.mode != "RGB":
+        bg = bg.convert("RGB")
+    else:
+        bg.load()
+
+    x = max(0, bg.width - fg.width - margin_right)
+    y = max(0, bg.height - fg.height - margin_bottom)
 
     # Optionales Panel (wenn gewünscht, einfach hier ein halbtransparentes Rechteck zeichnen)
     # Beispiel:
@@ -463,8 +896,105 @@ def generate(
     # bg.paste(panel_img, (max(0, x - pad), max(0, y - pad)), panel_img)
 
     bg.paste(fg, (x, y), fg)
+    del fg
+    _check_rss(max_rss_mb, "compose")
     bg.save(bg_image_path, "JPEG", quality=jpg_quality, optimize=True, progressive=True)
-
-
-__all__ = ["generate", "DEFAULT_TILES"]
-
+    return rv_epoch
+
+
+__all__ = ["generate", "DEFAULT_TILES", "viewport_tiles", "peak_rss_mb", "clear_tile_cache", "tile_cache_stats"]
+
+
+
+# ============================ Speichertest (synthetische Kacheln) ============================
+
+def _panel_check() -> bool:
+    """low_memory-Panel (ohne Verkleinerung) und Standard-Panel müssen pixelgleich sein."""
+    from PIL import ImageChops
+
+    radar = Image.effect_noise((300, 200), 60).convert("RGBA")
+    kw = dict(border_width=4, border_color="#808080", header_title="Rain Radar", radar_epoch=0,
+              timestamp_fmt="%Y-%m-%d %H:%M", attribution_text="© OpenStreetMap · Carto | Radar: RainViewer",
+              legend=True, legend_width=54, legend_padding=8)
+    a = _compose_panel(radar.copy(), **kw)
+    b = _compose_panel_lowmem(radar.copy(), **kw)
+    return a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+def _memtest_child(low_memory: bool, zoom: int, viewport: Tuple[int, int], max_rss_mb: Optional[float]) -> dict:
+    """Ein Render-Lauf mit simulierter HTTP-Session (läuft in eigenem Prozess → eigener Peak-RSS)."""
+    import tempfile
+    from modules.sites import _SimSession
+
+    buf = io.BytesIO()
+    # Komprimierbar wie echte Karten-/Radarkacheln (reines Rauschen würde den Byte-Cache aufblähen)
+    grad = Image.linear_gradient("L").resize((TILE_SIZE, TILE_SIZE))
+    tile = Image.merge("RGBA", [grad, grad.rotate(90), Image.new("L", grad.size, 180), grad.point(lambda v: v // 2)])
+    tile.save(buf, "PNG")
+    meta = b'{"host": "sim", "radar": {"past": [{"path": "/sim", "time": 0}]}}'
+    sim = _SimSession(0.0, buf.getvalue(), meta)
+    globals()["_get_session"] = lambda cfg: sim
+
+    with tempfile.TemporaryDirectory(prefix="raspberry-cam-memtest-") as tmp:
+        d = Path(tmp)
+        Image.new("RGB", (1920, 1080), (90, 120, 160)).save(d / "bg.jpg", "JPEG")
+        t0 = time.perf_counter()
+        generate(
+            {},
+            output_image_path=str(d / "radar.jpg"),
+            bg_image_path=str(d / "bg.jpg"),
+            radar_image_cache_path=str(d / "radar_last.png"),
+            basemap_image_cache_path=str(d / "basemap.png"),
+            zoom=zoom,
+            center=(49.454, 11.078),
+            viewport=viewport,
+            overlay_size=(400, None),
+            low_memory=low_memory,
+            max_rss_mb=max_rss_mb,
+        )
+    return {"low_memory": low_memory, "peak_rss_mb": round(peak_rss_mb(), 1),
+            "seconds": round(time.perf_counter() - t0, 2)}
+
+
+# CLI (Speichertest: Standard vs. low_memory, jeweils im eigenen Prozess)
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="Peak-RSS des Radar-Renderings mit synthetischen Kacheln")
+    parser.add_argument("--zoom", type=int, default=8)
+    parser.add_argument("--viewport", type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument("--max-rss-mb", type=float, default=60.0,
+                        help="Budget für den low_memory-Lauf (unter dem Peak des Standardpfads)")
+    parser.add_argument("--child", choices=["normal", "low"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        low = args.child == "low"
+        print(json.dumps(_memtest_child(low, args.zoom, tuple(args.viewport), args.max_rss_mb if low else None)))
+        sys.exit(0)
+
+    root = Path(__file__).resolve().parent.parent
+    results = {}
+    for mode in ("normal", "low"):
+        res = subprocess.run([sys.executable, "-m", "modules.rainintensity", "--child", mode,
+                              "--zoom", str(args.zoom), "--viewport", *map(str, args.viewport),
+                              "--max-rss-mb", str(args.max_rss_mb)],
+                             cwd=root, capture_output=True, text=True, check=False)
+        if res.returncode != 0:
+            print(f"❌ {mode}: {res.stderr.strip().splitlines()[-1] if res.stderr.strip() else res.returncode}")
+            sys.exit(1)
+        results[mode] = json.loads(res.stdout.strip().splitlines()[-1])
+        print(f"{mode:>6}: Peak-RSS {results[mode]['peak_rss_mb']} MB in {results[mode]['seconds']} s")
+
+    # Budget allein beweist nichts, wenn auch der Standardpfad darunter bleibt:
+    # low_memory muss messbar weniger brauchen
+    low, normal = results["low"]["peak_rss_mb"], results["normal"]["peak_rss_mb"]
+    ok = low <= args.max_rss_mb
+    lower = low < normal
+    same = _panel_check()
+    print(f"low_memory ≤ {args.max_rss_mb:.0f} MB: {'✅' if ok else '❌'} | "
+          f"low_memory < Standard ({low} < {normal} MB): {'✅' if lower else '❌'} | "
+          f"Panel pixelgleich: {'✅' if same else '❌'}")
+    sys.exit(0 if ok and lower and same else 1)
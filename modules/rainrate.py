@@ -0,0 +1,160 @@
+import json
+import io
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, List
+
+from PIL import Image
+
+from modules import persist
+from modules.rainintensity import _lonlat_to_px, _hex_to_rgb
+
+# Legende des RainViewer-Farbschemas 2 ("Universal Blue") als (dBZ, Farbe).
+# Angenähert an die veröffentlichte Farbskala; per cfg["rain"]["palette"] überschreibbar.
+UNIVERSAL_BLUE: List[Tuple[float, str]] = [
+    (10, "#88DDEE"),
+    (15, "#0099CC"),
+    (20, "#0077AA"),
+    (25, "#005588"),
+    (30, "#FFEE00"),
+    (35, "#FFAA00"),
+    (40, "#FF7700"),
+    (45, "#FF4400"),
+    (50, "#EE0000"),
+    (55, "#990000"),
+    (60, "#FFAAFF"),
+    (65, "#FF77FF"),
+    (70, "#FF44FF"),
+    (75, "#FFFFFF"),
+]
+
+
+def _get_defaults(cfg):
+    r = cfg.get("rain", {})
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    state_dir = (base_dir / "json" / "rain")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    loc = r.get("location") or cfg.get("center")
+    return {
+        "enabled": bool(r.get("enabled", True)),
+        "location": tuple(loc) if loc else None,   # (lat, lon)
+        "radius_px": int(r.get("radius_px", 2)),
+        "min_alpha": int(r.get("min_alpha", 1)),
+        "palette": [(float(z), c) for z, c in r.get("palette", UNIVERSAL_BLUE)],
+        "state_file": Path(r.get("state_file", state_dir / "rain_state.json")),
+    }
+
+
+def dbz_to_mmh(dbz: float) -> float:
+    """Marshall-Palmer: Z = 200 · R^1.6."""
+    return ((10.0 ** (dbz / 10.0)) / 200.0) ** (1.0 / 1.6)
+
+
+def _lut(palette: List[Tuple[float, str]]) -> Tuple[Image.Image, List[float], List[float]]:
+    """
+    Palettenbild für quantize() plus dBZ- und mm/h-Wert je Palettenindex (256 Einträge).
+    Freie Einträge wiederholen die erste Farbe → landen bei Gleichstand auf Index 0.
+    """
+    rgb: List[int] = []
+    for _, col in palette:
+        rgb.extend(_hex_to_rgb(col))
+    first = list(_hex_to_rgb(palette[0][1]))
+    rgb.extend(first * (256 - len(palette)))
+    pal_img = Image.new("P", (1, 1))
+    pal_img.putpalette(rgb)
+
+    dbz = [z for z, _ in palette] + [palette[0][0]] * (256 - len(palette))
+    mmh = [dbz_to_mmh(z) for z in dbz]
+    return pal_img, dbz, mmh
+
+
+def _decode(overlay: Image.Image, palette, min_alpha: int) -> Tuple[List[int], int]:
+    """
+    Ordnet jedem Pixel per quantize() die nächstliegende Legendenfarbe zu (komplett in C)
+    und zählt die Treffer je Index nur dort, wo überhaupt Radar-Echo ist (Alpha ≥ min_alpha).
+    Returns: (counts je Palettenindex, Pixelzahl gesamt)
+    """
+    pal_img, _, _ = _lut(palette)
+    idx = overlay.convert("RGB").quantize(palette=pal_img, dither=0)
+    mask = overlay.getchannel("A").point([255 if a >= min_alpha else 0 for a in range(256)])
+    return idx.histogram(mask=mask)[:256], overlay.width * overlay.height
+
+
+def _summarize(counts: List[int], total: int, palette) -> Dict[str, Any]:
+    _, dbz, mmh = _lut(palette)
+    rain_px = sum(counts)
+    if total <= 0:
+        return {"mmh": 0.0, "dbz": None, "max_mmh": 0.0, "rain_fraction": 0.0}
+    mean_mmh = sum(c * v for c, v in zip(counts, mmh)) / total
+    hit = [i for i, c in enumerate(counts) if c]
+    return {
+        "mmh": round(mean_mmh, 3),
+        "dbz": round(sum(counts[i] * dbz[i] for i in hit) / rain_px, 1) if rain_px else None,
+        "max_mmh": round(max((mmh[i] for i in hit), default=0.0), 3),
+        "rain_fraction": round(rain_px / total, 4),
+    }
+
+
+def measure(
+    cfg: Dict[str, Any],
+    radar_cache_path: Path,
+    location: Optional[Tuple[float, float]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Numerische Niederschlagsintensität aus dem gecachten Radar-Overlay:
+      current  – am Kamerastandort (Fenster von ±radius_px Pixeln)
+      area     – Mittel über den ganzen Ausschnitt (trockene Pixel zählen als 0)
+      rain_fraction – Anteil des Ausschnitts mit Echo
+    Wird einmal pro Radar-Epoche berechnet und gecacht.
+    """
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return None
+    location = d["location"] or location
+    if location is None:
+        return None
+
+    radar_cache_path = Path(radar_cache_path)
+    meta_path = radar_cache_path.with_suffix(".json")
+    if not persist.exists(radar_cache_path) or not persist.exists(meta_path):
+        return None
+    try:
+        meta = json.loads(persist.read_text(meta_path))
+        epoch, zoom, origin = int(meta["epoch"]), int(meta["zoom"]), meta["origin"]
+    except Exception:
+        return None  # alter Cache ohne zoom/origin
+
+    key = {"epoch": epoch, "location": [round(location[0], 5), round(location[1], 5)], "zoom": zoom}
+    if persist.exists(d["state_file"]):
+        try:
+            state = json.loads(persist.read_text(d["state_file"]))
+            if state.get("key") == key:
+                return state["result"]
+        except Exception:
+            pass
+
+    overlay = Image.open(io.BytesIO(persist.read_bytes(radar_cache_path))).convert("RGBA")
+    counts, total = _decode(overlay, d["palette"], d["min_alpha"])
+    area = _summarize(counts, total, d["palette"])
+
+    px, py = _lonlat_to_px(location[0], location[1], zoom)
+    x, y = int(px - origin[0]), int(py - origin[1])
+    current = None
+    if 0 <= x < overlay.width and 0 <= y < overlay.height:
+        r = d["radius_px"]
+        win = overlay.crop((max(0, x - r), max(0, y - r),
+                            min(overlay.width, x + r + 1), min(overlay.height, y + r + 1)))
+        c_counts, c_total = _decode(win, d["palette"], d["min_alpha"])
+        current = _summarize(c_counts, c_total, d["palette"])
+
+    result = {
+        "radar_epoch": epoch,
+        "location": list(location),
+        "current_mmh": current["mmh"] if current else None,
+        "current_dbz": current["dbz"] if current else None,
+        "current_max_mmh": current["max_mmh"] if current else None,
+        "area_mmh": area["mmh"],
+        "area_max_mmh": area["max_mmh"],
+        "rain_fraction": area["rain_fraction"],
+    }
+    persist.write_text(d["state_file"], json.dumps({"key": key, "result": result}))
+    return result
@@ -0,0 +1,111 @@
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+from modules import persist
+
+
+def _get_defaults(cfg):
+    s = cfg.get("scene", {})
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    state_dir = (base_dir / "json" / "scenechange")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return {
+        "enabled": bool(s.get("enabled", True)),
+        "threshold": float(s.get("threshold", 4.0)),
+        "size": int(s.get("size", 32)),
+        "reference_only": bool(s.get("reference_only", False)),
+        "state_file": Path(s.get("state_file", state_dir / "scene_state.json")),
+    }
+
+
+def _load_state(path: Path):
+    if persist.exists(path):
+        try:
+            return json.loads(persist.read_text(path))
+        except Exception:
+            pass
+    return {"fingerprint": None, "reference_path": None, "saved_bytes_upload": 0, "saved_bytes_disk": 0}
+
+
+def _save_state(path: Path, state):
+    persist.write_text(path, json.dumps(state))
+
+
+def _fingerprint(img_path: Path, size: int) -> Image.Image:
+    """
+    Graustufen-Miniatur (size × size). draft() lässt den JPEG-Decoder direkt
+    herunterskalieren → nur ein Bruchteil der Pixel wird überhaupt dekodiert.
+    """
+    with Image.open(img_path) as im:
+        im.draft("L", (size * 4, size * 4))
+        return im.convert("L").resize((size, size), Image.BILINEAR)
+
+
+def _mean_abs_diff(a: Image.Image, b: Image.Image) -> float:
+    """Mittlere absolute Pixeldifferenz (0..255), komplett in C (ImageChops/ImageStat)."""
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+
+def check(cfg: Dict[str, Any], img_path: Path, reference_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Vergleicht die neue Aufnahme mit dem letzten *behaltenen* Referenzbild
+    (nicht mit dem direkten Vorgänger – sonst bliebe schleichende Änderung
+    unter der Schwelle). Liefert das Scene-Resultat für das JSON.
+    """
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return {"changed": True, "score": None, "threshold": d["threshold"],
+                "reference_only": False, "reference_path": None}
+
+    state = _load_state(d["state_file"])
+    fp = _fingerprint(img_path, d["size"])
+
+    score = None
+    prev_hex = state.get("fingerprint")
+    if prev_hex:
+        try:
+            prev = Image.frombytes("L", (d["size"], d["size"]), bytes.fromhex(prev_hex))
+            score = _mean_abs_diff(fp, prev)
+        except Exception:
+            score = None  # Größe geändert/defekt → als Änderung werten
+
+    changed = score is None or score >= d["threshold"]
+
+    saved_upload = 0
+    saved_disk = 0
+    if changed:
+        state["fingerprint"] = fp.tobytes().hex()
+        state["reference_path"] = str(reference_path) if reference_path else None
+        state["last_change"] = time.time()
+    else:
+        size = img_path.stat().st_size
+        saved_upload = size
+        # Archiv + classified-Kopie entfallen nur im Referenzmodus
+        saved_disk = 2 * size if d["reference_only"] else 0
+        state["saved_bytes_upload"] = int(state.get("saved_bytes_upload", 0)) + saved_upload
+        state["saved_bytes_disk"] = int(state.get("saved_bytes_disk", 0)) + saved_disk
+
+    _save_state(d["state_file"], state)
+
+    result = {
+        "changed": changed,
+        "score": None if score is None else round(score, 3),
+        "threshold": d["threshold"],
+        "reference_only": d["reference_only"] and not changed,
+        "reference_path": state.get("reference_path"),
+        "saved_bytes_upload": saved_upload,
+        "saved_bytes_disk": saved_disk,
+        "saved_bytes_upload_total": int(state.get("saved_bytes_upload", 0)),
+        "saved_bytes_disk_total": int(state.get("saved_bytes_disk", 0)),
+    }
+
+    score_txt = "n/a" if score is None else f"{score:.2f}"
+    print(f"[Scene] Diff {score_txt} (Schwelle {d['threshold']:.2f}) → "
+          f"{'Änderung' if changed else 'unverändert'}; gespart gesamt: "
+          f"Upload {result['saved_bytes_upload_total']} B, Disk {result['saved_bytes_disk_total']} B")
+    return result
+
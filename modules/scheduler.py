@@ -0,0 +1,171 @@
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+from modules import persist
+
+
+def _get_defaults(cfg):
+    s = cfg.get("schedule", {})
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
+    state_dir = (base_dir / "json" / "scheduler")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    min_interval = float(s.get("min_interval", 120))
+    max_interval = max(min_interval, float(s.get("max_interval", 1800)))
+    return {
+        "enabled": bool(s.get("enabled", False)),
+        "min_interval": min_interval,
+        "max_interval": max_interval,
+        "base_interval": float(s.get("base_interval", 600)),
+        "watch_interval": float(s.get("watch_interval", 300)),
+        "grow": float(s.get("grow", 1.5)),
+        "shrink": float(s.get("shrink", 0.5)),
+        "tolerance": float(s.get("tolerance", 20)),
+        "owm_wind_delta": float(s.get("owm_wind_delta", 2.0)),
+        "owm_clouds_delta": float(s.get("owm_clouds_delta", 20)),
+        "scene_score": float(s.get("scene_score", 10.0)),
+        "history": int(s.get("history", 50)),
+        "state_file": Path(s.get("state_file", state_dir / "schedule_state.json")),
+    }
+
+
+def _load_state(path: Path):
+    if persist.exists(path):
+        try:
+            return json.loads(persist.read_text(path))
+        except Exception:
+            pass
+    return {"interval": None, "next_run": 0.0, "history": []}
+
+
+def _save_state(path: Path, state):
+    persist.write_text(path, json.dumps(state))
+
+
+def _owm_snapshot(owm: Dict[str, Any]) -> Dict[str, Any]:
+    if not owm or "error" in owm:
+        return {}
+    w0list = owm.get("weather") or [{}]
+    w0 = w0list[0] if isinstance(w0list, list) and w0list else {}
+    wind = owm.get("wind", {}) or {}
+    return {
+        "weather_id": w0.get("id"),
+        "clouds": (owm.get("clouds") or {}).get("all"),
+        "wind": wind.get("gust", wind.get("speed")),
+    }
+
+
+def _owm_changed(prev: Dict[str, Any], cur: Dict[str, Any], d) -> bool:
+    if not prev or not cur:
+        return False
+    if prev.get("weather_id") != cur.get("weather_id"):
+        return True
+    try:
+        if abs(float(cur["clouds"]) - float(prev["clouds"])) >= d["owm_clouds_delta"]:
+            return True
+    except Exception:
+        pass
+    try:
+        if abs(float(cur["wind"]) - float(prev["wind"])) >= d["owm_wind_delta"]:
+            return True
+    except Exception:
+        pass
+    return False
+
+
+def due(cfg: Dict[str, Any], now: Optional[float] = None) -> bool:
+    """
+    True, wenn der nächste Lauf fällig ist. Cron ruft main.py im Takt von
+    min_interval auf; nicht fällige Läufe beenden sich sofort.
+    """
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return True
+    now = time.time() if now is None else now
+    state = _load_state(d["state_file"])
+    # Toleranz gegen Cron-Jitter (Lauf startet ein paar Sekunden „zu früh“)
+    return now + d["tolerance"] >= float(state.get("next_run", 0.0))
+
+
+def seconds_until_due(cfg: Dict[str, Any], now: Optional[float] = None) -> Optional[float]:
+    """Wartezeit bis zum nächsten fälligen Lauf (Dauerbetrieb main.py --loop); None, wenn deaktiviert."""
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return None
+    now = time.time() if now is None else now
+    state = _load_state(d["state_file"])
+    return max(0.0, float(state.get("next_run", 0.0)) - d["tolerance"] - now)
+
+
+def plan(
+    cfg: Dict[str, Any],
+    *,
+    storm: Optional[Dict[str, Any]],
+    owm: Dict[str, Any],
+    radar_epoch: Optional[int] = None,
+    scene: Optional[Dict[str, Any]] = None,
+    now: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Legt das nächste Intervall fest und protokolliert die Entscheidung:
+      STORM           → min_interval
+      WATCH           → höchstens watch_interval, sonst schrumpfen
+      ≥ 2 Signale     → schrumpfen (Radar-Epoche neu, OWM-Änderung, Bilddifferenz)
+      Bilddifferenz   → schrumpfen, auch allein (starkes Signal: die Kamera sieht die Änderung selbst)
+      1 Signal        → halten (Radar oder OWM allein)
+      ruhig           → wachsen
+    Immer begrenzt auf [min_interval, max_interval].
+    """
+    d = _get_defaults(cfg)
+    if not d["enabled"]:
+        return None
+    now = time.time() if now is None else now
+
+    state = _load_state(d["state_file"])
+    prev = float(state.get("interval") or d["base_interval"])
+    storm_state = (storm or {}).get("new_state", "OK")
+
+    signals: List[str] = []
+    if radar_epoch is not None and state.get("radar_epoch") not in (None, radar_epoch):
+        signals.append("radar")
+    snap = _owm_snapshot(owm)
+    if _owm_changed(state.get("owm") or {}, snap, d):
+        signals.append("owm")
+    if scene and scene.get("score") is not None and scene["score"] >= d["scene_score"]:
+        signals.append("scene")
+
+    if storm_state == "STORM":
+        interval, reason = d["min_interval"], "storm"
+    elif storm_state == "WATCH":
+        interval, reason = min(prev * d["shrink"] if signals else prev, d["watch_interval"]), "watch"
+    elif len(signals) >= 2 or "scene" in signals:
+        interval, reason = prev * d["shrink"], "changing"
+    elif signals:
+        interval, reason = prev, "hold"
+    else:
+        interval, reason = prev * d["grow"], "calm"
+    interval = max(d["min_interval"], min(d["max_interval"], interval))
+
+    decision = {
+        "timestamp": now,
+        "prev_interval": round(prev, 1),
+        "interval": round(interval, 1),
+        "next_run": now + interval,
+        "reason": reason,
+        "signals": signals,
+        "storm_state": storm_state,
+    }
+
+    state["interval"] = interval
+    state["next_run"] = decision["next_run"]
+    if radar_epoch is not None:
+        state["radar_epoch"] = radar_epoch
+    if snap:
+        state["owm"] = snap
+    history = (state.get("history") or []) + [decision]
+    state["history"] = history[-d["history"]:]
+    _save_state(d["state_file"], state)
+
+    print(f"[Schedule] {reason} {signals}: {prev:.0f}s → {interval:.0f}s")
+    return decision
@@ -0,0 +1,371 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from modules import persist
+from modules import sites
+
+# Lokaler HTTP-Server (asyncio, ein Thread): liefert Live-Bild, Radar-JPG und letztes JSON
+# aus dem Speicher, mit ETag/If-None-Match und Range, plus MJPEG-Stream (/stream.mjpg),
+# der jedes neue Bild aus *einem* gemeinsam vorkodierten Puffer an alle Clients schiebt.
+# Start als Dienst:  python3 -m modules.server
+
+BOUNDARY = b"frame"
+
+
+def _get_defaults(cfg):
+    s = cfg.get("server", {})
+    return {
+        "host": s.get("host", "0.0.0.0"),
+        "port": int(s.get("port", 8080)),
+        "poll_interval": float(s.get("poll_interval", 1.0)),
+        "max_clients": int(s.get("max_clients", 1000)),
+        "send_timeout": float(s.get("send_timeout", 15.0)),
+    }
+
+
+class _Asset:
+    """Eine Datei im Speicher; wird per mtime/size-Polling aktualisiert."""
+
+    def __init__(self, path: Path, ctype: str):
+        self.path = Path(path)
+        self.ctype = ctype
+        self.data: Optional[bytes] = None
+        self.etag = ""
+        self.last_modified = ""
+        self.part = b""          # vorkodierter MJPEG-Part (Header + JPEG), geteilt von allen Clients
+        self.version = 0
+        self._key: Optional[Tuple[int, int]] = None
+        self.changed = asyncio.Condition()
+
+    async def refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return  # kurzzeitig weg (Capture-Skript räumt auf) → alten Stand weiter ausliefern
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self._key:
+            return
+        data = await asyncio.to_thread(self.path.read_bytes)
+        if self.ctype == "image/jpeg" and not data.endswith(b"\xff\xd9"):
+            return  # halb geschrieben → beim nächsten Poll erneut
+        self.set(data, st.st_mtime)
+        self._key = key
+
+    def set(self, data: bytes, mtime: Optional[float] = None) -> None:
+        self.data = data
+        self.etag = '"%s"' % hashlib.blake2b(data, digest_size=8).hexdigest()
+        self.last_modified = formatdate(mtime if mtime is not None else time.time(), usegmt=True)
+        self.part = (b"--" + BOUNDARY + b"\r\nContent-Type: " + self.ctype.encode()
+                     + b"\r\nContent-Length: " + str(len(data)).encode() + b"\r\n\r\n" + data + b"\r\n")
+        self.version += 1
+
+    async def publish(self) -> None:
+        async with self.changed:
+            self.changed.notify_all()
+
+
+def _parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """Einzelner Bereich 'bytes=a-b' | 'bytes=a-' | 'bytes=-n' → (start, end inkl.); None = ungültig."""
+    if not value.startswith("bytes=") or "," in value:
+        return None
+    start_s, _, end_s = value[6:].strip().partition("-")
+    try:
+        if start_s == "":
+            n = int(end_s)
+            if n <= 0:
+                return None
+            return max(0, size - n), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class FrameServer:
+    def __init__(self, assets: Dict[str, Dict[str, _Asset]], *, max_clients: int = 1000,
+                 send_timeout: float = 15.0):
+        # assets[site][name]; der erste Standort ist zusätzlich unter "/" erreichbar
+        self.assets = assets
+        self.default_site = next(iter(assets))
+        self.max_clients = max_clients
+        self.send_timeout = send_timeout
+        self.clients = 0
+        self.streams = 0
+
+    def _route(self, path: str) -> Tuple[Optional[_Asset], bool]:
+        parts = [p for p in path.split("/") if p]
+        site = self.default_site
+        if len(parts) == 2 and parts[0] in self.assets:
+            site = parts.pop(0)
+        if len(parts) != 1:
+            return None, False
+        name = parts[0]
+        if name == "stream.mjpg":
+            return self.assets[site].get("frame.jpg"), True
+        return self.assets[site].get(name), False
+
+    async def _write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), self.send_timeout)
+
+    async def _respond(self, writer, status: str, headers: Dict[str, str], body: bytes = b"") -> None:
+        head = [f"HTTP/1.1 {status}"] + [f"{k}: {v}" for k, v in headers.items()]
+        await self._write(writer, ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        try:
+            if self.clients > self.max_clients:
+                await self._respond(writer, "503 Service Unavailable",
+                                    {"Content-Length": "0", "Connection": "close", "Retry-After": "5"})
+                return
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = (lines[0].split(" ", 2) + ["", ""])[:3]
+            headers = {}
+            for line in lines[1:]:
+                k, sep, v = line.partition(":")
+                if sep:
+                    headers[k.strip().lower()] = v.strip()
+
+            if method not in ("GET", "HEAD"):
+                await self._respond(writer, "405 Method Not Allowed",
+                                    {"Allow": "GET, HEAD", "Content-Length": "0", "Connection": "close"})
+                return
+
+            asset, stream = self._route(target.split("?", 1)[0])
+            if asset is None or asset.data is None:
+                await self._respond(writer, "404 Not Found", {"Content-Length": "0", "Connection": "close"})
+                return
+            if stream:
+                await self._stream(reader, writer, asset, head_only=(method == "HEAD"))
+            else:
+                await self._serve(writer, asset, headers, head_only=(method == "HEAD"))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.clients -= 1
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _serve(self, writer, asset: _Asset, headers: Dict[str, str], head_only: bool) -> None:
+        data, etag = asset.data, asset.etag
+        base = {
+            "Content-Type": asset.ctype,
+            "ETag": etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+            "Connection": "close",
+        }
+        inm = headers.get("if-none-match")
+        if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+            await self._respond(writer, "304 Not Modified", {**base, "Content-Length": "0"})
+            return
+
+        rng = headers.get("range")
+        if_range = headers.get("if-range")
+        if rng and (not if_range or if_range == etag):
+            r = _parse_range(rng, len(data))
+            if r is None:
+                await self._respond(writer, "416 Range Not Satisfiable",
+                                    {**base, "Content-Range": f"bytes */{len(data)}", "Content-Length": "0"})
+                return
+            start, end = r
+            body = data[start:end + 1]
+            await self._respond(writer, "206 Partial Content", {
+                **base,
+                "Content-Range": f"bytes {start}-{end}/{len(data)}",
+                "Content-Length": str(len(body)),
+            }, b"" if head_only else body)
+            return
+
+        await self._respond(writer, "200 OK", {**base, "Content-Length": str(len(data))},
+                            b"" if head_only else data)
+
+    @staticmethod
+    async def _next_version(asset: _Asset, version: int) -> None:
+        async with asset.changed:
+            await asset.changed.wait_for(lambda: asset.version != version)
+
+    async def _stream(self, reader, writer, asset: _Asset, head_only: bool) -> None:
+        await self._respond(writer, "200 OK", {
+            "Content-Type": "multipart/x-mixed-replace; boundary=" + BOUNDARY.decode(),
+            "Cache-Control": "no-cache",
+            "Connection": "close",
+        })
+        if head_only:
+            return
+        self.streams += 1
+        # Client sendet nach dem Request nichts mehr → read() endet erst beim Verbindungsabbau.
+        # So werden getrennte Viewer sofort freigegeben, nicht erst beim nächsten Bild.
+        eof = asyncio.ensure_future(reader.read(1))
+        try:
+            version = asset.version
+            await self._write(writer, asset.part)
+            while True:
+                waiter = asyncio.ensure_future(self._next_version(asset, version))
+                done, _ = await asyncio.wait({waiter, eof}, return_when=asyncio.FIRST_COMPLETED)
+                if eof in done:
+                    waiter.cancel()
+                    return
+                # Langsame Clients überspringen Zwischenbilder: immer nur der neueste Part
+                version = asset.version
+                await self._write(writer, asset.part)
+        finally:
+            eof.cancel()
+            self.streams -= 1
+
+
+def _site_assets(base: Path, cfg: Dict[str, Any]) -> Dict[str, Dict[str, _Asset]]:
+    assets = {}
+    for name, site_base, site_cfg in sites.site_configs(base, cfg):
+        cur = sites.current_dir(site_base, site_cfg)
+        assets[name] = {
+            "frame.jpg": _Asset(cur / site_cfg.get("local_file", "IMG_4903.jpg"), "image/jpeg"),
+            "radar.jpg": _Asset(cur / site_cfg.get("radar_file", "radar_Nuremberg_zoom6.jpg"), "image/jpeg"),
+            "latest.json": _Asset(cur / "latest.json", "application/json"),
+        }
+    return assets
+
+
+async def _watch(assets: Dict[str, Dict[str, _Asset]], poll_interval: float) -> None:
+    while True:
+        for site in assets.values():
+            for asset in site.values():
+                before = asset.version
+                await asset.refresh()
+                if asset.version != before:
+                    await asset.publish()
+        await asyncio.sleep(poll_interval)
+
+
+async def serve(cfg: Dict[str, Any], base: Path) -> None:
+    d = _get_defaults(cfg)
+    persist.configure(cfg)
+    assets = _site_assets(base, cfg)
+    fs = FrameServer(assets, max_clients=d["max_clients"], send_timeout=d["send_timeout"])
+    watcher = asyncio.create_task(_watch(assets, d["poll_interval"]))
+    server = await asyncio.start_server(fs.handle, d["host"], d["port"], backlog=512)
+    print(f"🌐 Server auf http://{d['host']}:{d['port']}/ (frame.jpg, radar.jpg, latest.json, stream.mjpg)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+# ============================ Lasttest ============================
+
+async def _loadtest(n_stream: int, n_get: int, frames: int) -> Dict[str, Any]:
+    """In-Process-Lasttest: n_stream MJPEG-Clients + n_get bedingte GETs gegen synthetische Bilder."""
+    with tempfile.TemporaryDirectory(prefix="raspberry-cam-server-") as tmp:
+        return await _loadtest_in(Path(tmp), n_stream, n_get, frames)
+
+
+async def _loadtest_in(tmp: Path, n_stream: int, n_get: int, frames: int) -> Dict[str, Any]:
+    frame_path = tmp / "frame.jpg"
+    payload = os.urandom(150_000)
+
+    def write_frame(i: int) -> None:
+        frame_path.write_bytes(b"\xff\xd8" + i.to_bytes(4, "big") + payload + b"\xff\xd9")
+
+    write_frame(0)
+    asset = _Asset(frame_path, "image/jpeg")
+    await asset.refresh()
+    fs = FrameServer({"sim": {"frame.jpg": asset}}, max_clients=n_stream + n_get + 10)
+    server = await asyncio.start_server(fs.handle, "127.0.0.1", 0, backlog=2048)
+    port = server.sockets[0].getsockname()[1]
+
+    async def stream_client(received: list) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /stream.mjpg HTTP/1.1\r\nHost: x\r\n\r\n")
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+        count = 0
+        try:
+            while count < frames:
+                await reader.readuntil(b"--" + BOUNDARY + b"\r\n")
+                hdr = await reader.readuntil(b"\r\n\r\n")
+                length = int(hdr.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                await reader.readexactly(length + 2)
+                count += 1
+        finally:
+            received.append(count)
+            writer.close()
+
+    async def get_client(statuses: list) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET /frame.jpg HTTP/1.1\r\nHost: x\r\nIf-None-Match: {asset.etag}\r\n\r\n".encode())
+        await writer.drain()
+        statuses.append((await reader.readline()).split(b" ")[1])
+        await reader.read()
+        writer.close()
+
+    received: list = []
+    statuses: list = []
+    t0 = time.perf_counter()
+    streams = [asyncio.create_task(stream_client(received)) for _ in range(n_stream)]
+    while fs.streams < n_stream:
+        await asyncio.sleep(0.01)
+    t_connect = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    await asyncio.gather(*(get_client(statuses) for _ in range(n_get)))
+    t_get = time.perf_counter() - t1
+
+    t2 = time.perf_counter()
+    for i in range(1, frames):
+        write_frame(i)
+        await asset.refresh()
+        await asset.publish()
+        await asyncio.sleep(0.05)
+    await asyncio.wait_for(asyncio.gather(*streams), 60)
+    t_push = time.perf_counter() - t2
+    while fs.clients:
+        await asyncio.sleep(0.01)
+
+    server.close()
+    await server.wait_closed()
+    return {
+        "stream_clients": n_stream,
+        "connect_s": round(t_connect, 3),
+        "frames_min": min(received) if received else 0,
+        "push_s": round(t_push, 3),
+        "push_mb_per_s": round(sum(received) * len(asset.data) / t_push / 1e6, 1),
+        "get_requests": n_get,
+        "get_per_s": round(n_get / t_get, 1),
+        "get_304": sum(1 for s in statuses if s == b"304"),
+    }
+
+
+# CLI
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler HTTP-/MJPEG-Server für Live-Bild, Radar und JSON")
+    parser.add_argument("--loadtest", type=int, metavar="N", help="Lasttest mit N MJPEG-Clients statt Serverbetrieb")
+    parser.add_argument("--gets", type=int, default=500, help="Bedingte GETs im Lasttest")
+    parser.add_argument("--frames", type=int, default=10, help="Bilder pro Stream im Lasttest")
+    args = parser.parse_args()
+
+    if args.loadtest:
+        print(json.dumps(asyncio.run(_loadtest(args.loadtest, args.gets, args.frames)), indent=2))
+    else:
+        base = Path(__file__).resolve().parent.parent
+        cfg_path = base / "config.local.json"
+        if not cfg_path.exists():
+            raise FileNotFoundError(f"Config-Datei nicht gefunden: {cfg_path}")
+        cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
+        asyncio.run(serve(cfg, base))
@@ -0,0 +1,184 @@
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Callable
+
+from modules import persist
+
+# Schlüssel, die nur auf Host-Ebene gelten und nicht in die Standort-Config wandern
+_HOST_KEYS = ("sites", "max_workers")
+
+
+def site_configs(base: Path, cfg: Dict[str, Any]) -> List[Tuple[str, Path, Dict[str, Any]]]:
+    """
+    Liefert [(name, site_base, site_cfg), ...].
+    Ohne "sites" in der Config: genau ein Standort im Projektverzeichnis (bisheriges Verhalten).
+    Mit "sites": jeder Eintrag überschreibt die globalen Schlüssel (city, tiles, zoom,
+    remote_*, storm, scene, …); Zustand und Ausgaben liegen isoliert unter sites/<name>/.
+    """
+    sites = cfg.get("sites")
+    if not sites:
+        return [("default", base, cfg)]
+
+    out = []
+    seen = set()
+    for i, site in enumerate(sites):
+        name = str(site.get("name") or f"site{i}")
+        safe = "".join(c for c in name if c.isalnum() or c in ("_", "-")) or f"site{i}"
+        if safe in seen:
+            raise ValueError(f"Standortname doppelt: {name}")
+        seen.add(safe)
+
+        site_base = base / "sites" / safe
+        site_cfg = {k: v for k, v in cfg.items() if k not in _HOST_KEYS}
+        site_cfg.update(site)
+        site_cfg["name"] = safe
+        site_cfg["data_dir"] = str(site_base)
+        out.append((safe, site_base, site_cfg))
+    return out
+
+
+def current_dir(site_base: Path, site_cfg: Dict[str, Any]) -> Path:
+    """
+    Verzeichnis für flüchtige Dateien eines Standorts (Aufnahme, Live-Bild, Radar-JPG,
+    latest.json) – bei aktivem Staging im RAM, sonst jpg/current.
+    """
+    staging = persist.staging_dir()
+    if staging:
+        return staging / "current" / site_cfg.get("name", "default")
+    return site_base / "jpg" / "current"
+
+
+def run_sites(
+    sites: List[Tuple[str, Path, Dict[str, Any]]],
+    worker: Callable[[Path, Dict[str, Any]], Any],
+    max_workers: int = 2,
+) -> Dict[str, Any]:
+    """
+    Führt worker(site_base, site_cfg) für alle Standorte mit begrenzter Parallelität aus.
+    Fehler eines Standorts brechen die anderen nicht ab (Ergebnis dann None).
+    """
+    results: Dict[str, Any] = {}
+    if len(sites) == 1:
+        name, site_base, site_cfg = sites[0]
+        results[name] = worker(site_base, site_cfg)
+        return results
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    workers = max(1, min(int(max_workers), len(sites)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="site") as ex:
+        futures = {ex.submit(worker, site_base, site_cfg): name for name, site_base, site_cfg in sites}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                print(f"❌ Standort {name}: {e}")
+                results[name] = None
+    return results
+
+
+# ============================ Benchmark (simulierte Standorte) ============================
+
+class _SimResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class _SimSession:
+    """Ersetzt die HTTP-Session: feste Latenz pro Request, liefert eine Dummy-Kachel."""
+
+    def __init__(self, latency: float, tile: bytes, meta: bytes):
+        self.latency = latency
+        self.tile = tile
+        self.meta = meta
+
+    def get(self, url, timeout=None):
+        time.sleep(self.latency)
+        return _SimResponse(self.meta if url.endswith(".json") else self.tile)
+
+
+def _bench(n_sites: int, max_workers: int, latency: float) -> Dict[str, Any]:
+    import io
+    import tempfile
+    from PIL import Image
+    from modules import openweathermap
+    from modules import rainintensity as ri
+
+    buf = io.BytesIO()
+    Image.new("RGBA", (ri.TILE_SIZE, ri.TILE_SIZE), (0, 120, 255, 128)).save(buf, "PNG")
+    tile = buf.getvalue()
+    meta = b'{"host": "sim", "radar": {"past": [{"path": "/sim", "time": 0}]}}'
+
+    ri.clear_tile_cache()
+    openweathermap.clear_cache()
+    owm_calls = []
+
+    def sim_owm(api_key, city, timeout=10):
+        owm_calls.append(city)
+        time.sleep(latency)
+        return {"name": city, "wind": {"speed": 3.0}}
+
+    # Standorte: überlappende 2×2-Ausschnitte entlang einer Kachelzeile, 4 Städte
+    tmp = tempfile.TemporaryDirectory(prefix="raspberry-cam-bench-")
+    data_dir = tmp.name
+    sites = []
+    for i in range(n_sites):
+        x0 = 33 + (i % 8)
+        sites.append((f"sim{i}", Path("."), {
+            "name": f"sim{i}",
+            "data_dir": f"{data_dir}/sim{i}",
+            "openweathermap_api_key": "sim",
+            "city": f"City{i % 4},de",
+            "tiles": [(x0, 21), (x0 + 1, 21), (x0, 22), (x0 + 1, 22)],
+        }))
+
+    def worker(site_base, site_cfg):
+        session = _SimSession(latency, tile, meta)
+        tiles = site_cfg["tiles"]
+        base = ri._compose_basemap(session, tiles, zoom=6, read_timeout=1.0, retries=0)
+        host, rv_path, _ = ri._get_latest_radar_meta(session, read_timeout=1.0)
+        overlay = ri._compose_radar_overlay(session, tiles, zoom=6, host=host, rv_path=rv_path,
+                                            palette=2, smooth=1, snow=1, read_timeout=1.0,
+                                            retries=0, opacity=0.85)
+        base.alpha_composite(overlay)
+        return openweathermap.get_openweathermap(site_cfg)
+
+    orig_fetch = openweathermap._fetch
+    openweathermap._fetch = sim_owm
+    try:
+        t0 = time.perf_counter()
+        run_sites(sites, worker, max_workers=max_workers)
+        elapsed = time.perf_counter() - t0
+    finally:
+        openweathermap._fetch = orig_fetch
+        tmp.cleanup()
+
+    stats = ri.tile_cache_stats()
+    return {
+        "sites": n_sites,
+        "seconds": round(elapsed, 3),
+        "sites_per_s": round(n_sites / elapsed, 2),
+        "http_fetches": stats["misses"],
+        "cache_hits": stats["hits"],
+        "owm_calls": len(owm_calls),
+    }
+
+
+# CLI (nur Benchmark)
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-Site Benchmark mit simulierten Standorten")
+    parser.add_argument("--sites", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulierte HTTP-Latenz in s")
+    args = parser.parse_args()
+
+    for n in args.sites:
+        r = _bench(n, args.workers, args.latency)
+        print(f"{r['sites']:>3} Standorte: {r['seconds']:.3f} s ({r['sites_per_s']} /s), "
+              f"HTTP {r['http_fetches']}, Cache-Treffer {r['cache_hits']}, OWM {r['owm_calls']}")
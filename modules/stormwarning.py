@@ -1,13 +1,19 @@
-import smtplib
-from email.message import EmailMessage
 import json
+import math
 import time
+from collections import deque
 from pathlib import Path
-import argparse
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, List
 
-def _send_mail(cfg, subject, body):
-    with smtplib.SMTP(cfg["smtp_server"], cfg["smtp_port"]) as server:
+from modules import persist
+from modules.deadline import Deadline
+
+def _send_mail(cfg, subject, body, timeout=30):
+    # Nur bei Zustandswechseln gebraucht – smtplib/ssl nicht bei jedem Start laden
+    import smtplib
+    from email.message import EmailMessage
+
+    with smtplib.SMTP(cfg["smtp_server"], cfg["smtp_port"], timeout=timeout) as server:
         server.starttls()
         server.login(cfg["smtp_user"], cfg["smtp_pass"])
         msg = EmailMessage()
@@ -22,7 +28,7 @@ def send_test_mail(cfg):
 
 def _get_defaults(cfg):
     s = cfg.get("storm", {})
-    base_dir = Path(__file__).resolve().parent.parent
+    base_dir = Path(cfg.get("data_dir") or Path(__file__).resolve().parent.parent)
     state_dir = (base_dir / "json" / "stormwarning")
     state_dir.mkdir(parents=True, exist_ok=True)
     return {
@@ -31,18 +37,129 @@ def _get_defaults(cfg):
         "state_file": state_dir / "storm_state.json",
         "units": s.get("units", "m/s"),
         "location": s.get("location", "N/A"),
+        # Grundlage der Stufe: "instant" (Einzelwert wie früher), "mean" oder "ewma" (geglättet)
+        "basis": s.get("basis", "ewma"),
+        "window": max(2, int(s.get("window", 12))),     # Stichproben im Rollfenster
+        "tau_min": float(s.get("tau_min", 15.0)),       # Zeitkonstante der EWMA in Minuten
+        # Trend: steigt der Wind um ≥ trend_rise pro Stunde und erreicht die Hochrechnung
+        # über trend_horizon_h die STORM-Schwelle, wird vorab auf WATCH gestellt
+        "trend_rise": float(s.get("trend_rise", 3.0)),
+        "trend_horizon_h": float(s.get("trend_horizon_h", 1.0)),
+        # Rückstufung erst, wenn der anhaltende Wind um hysteresis unter der Schwelle liegt
+        "hysteresis": float(s.get("hysteresis", 1.0)),
     }
 
 def _load_state(path: Path):
-    if path.exists():
+    if persist.exists(path):
         try:
-            return json.loads(path.read_text(encoding="utf-8"))
+            return json.loads(persist.read_text(path))
         except Exception:
             pass
     return {"state": "OK", "last_update": 0.0}
 
+
+class RollingStats:
+    """
+    Rollfenster über die letzten `size` Stichproben (t in s, v) mit O(1)-Update:
+      mean  – laufende Summe
+      max   – monotone Deque (amortisiert O(1))
+      ewma  – zeitgewichtet, alpha = 1 − exp(−Δt/τ), unabhängig vom Aufnahmeintervall
+      slope – lineare Regression v über t (Einheit pro Stunde) aus laufenden Summen;
+              die Zeitachse wird bei jedem Update auf die neueste Stichprobe verschoben,
+              damit die Summen klein bleiben (kein Auslöschungsfehler bei Epochensekunden).
+    Alle `size` Updates werden die Summen aus dem Puffer neu gebildet (Rundungsdrift).
+    """
+
+    def __init__(self, size: int, tau_min: float, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.size = size
+        self.tau = tau_min * 60.0
+        self.seq = int(data.get("seq", 0))
+        self.samples = deque(tuple(x) for x in data.get("samples", []))   # (seq, t, v)
+        self.maxq = deque(tuple(x) for x in data.get("maxq", []))                        # (seq, v)
+        self.ewma = data.get("ewma")
+        self.ref = float(data.get("ref", 0.0))
+        while len(self.samples) > size:
+            self.samples.popleft()
+        self._resync()
+
+    def _resync(self) -> None:
+        self.n = len(self.samples)
+        xs = [((t - self.ref) / 3600.0, v) for _, t, v in self.samples]
+        self.s_v = sum(v for _, v in xs)
+        self.s_x = sum(x for x, _ in xs)
+        self.s_xx = sum(x * x for x, _ in xs)
+        self.s_xv = sum(x * v for x, v in xs)
+        lo = self.seq - self.size
+        while self.maxq and self.maxq[0][0] <= lo:
+            self.maxq.popleft()
+
+    @property
+    def last_t(self) -> Optional[float]:
+        return self.samples[-1][1] if self.samples else None
+
+    def push(self, t: float, v: float) -> None:
+        last_t = self.last_t
+        # Zeitachse auf t verschieben: Σ(x−c), Σ(x−c)², Σ(x−c)v
+        c = (t - self.ref) / 3600.0
+        self.s_xx += -2 * c * self.s_x + self.n * c * c
+        self.s_xv -= c * self.s_v
+        self.s_x -= self.n * c
+        self.ref = t
+
+        self.seq += 1
+        self.samples.append((self.seq, t, v))
+        self.n += 1
+        self.s_v += v           # x = 0 für die neue Stichprobe
+
+        if len(self.samples) > self.size:
+            _, t_o, v_o = self.samples.popleft()
+            x_o = (t_o - self.ref) / 3600.0
+            self.n -= 1
+            self.s_v -= v_o
+            self.s_x -= x_o
+            self.s_xx -= x_o * x_o
+            self.s_xv -= x_o * v_o
+
+        while self.maxq and self.maxq[-1][1] <= v:
+            self.maxq.pop()
+        self.maxq.append((self.seq, v))
+        while self.maxq[0][0] <= self.seq - self.size:
+            self.maxq.popleft()
+
+        if self.ewma is None or last_t is None:
+            self.ewma = v
+        else:
+            alpha = 1.0 - math.exp(-max(0.0, t - last_t) / self.tau) if self.tau > 0 else 1.0
+            self.ewma += alpha * (v - self.ewma)
+
+        if self.seq % self.size == 0:
+            self._resync()
+
+    def mean(self) -> Optional[float]:
+        return self.s_v / self.n if self.n else None
+
+    def max(self) -> Optional[float]:
+        return self.maxq[0][1] if self.maxq else None
+
+    def slope(self) -> Optional[float]:
+        """Änderung pro Stunde; None bei < 2 Stichproben oder gleichen Zeitpunkten."""
+        denom = self.n * self.s_xx - self.s_x * self.s_x
+        if self.n < 2 or denom <= 1e-12:
+            return None
+        return (self.n * self.s_xv - self.s_x * self.s_v) / denom
+
+    def summary(self) -> Dict[str, Any]:
+        r = lambda x: None if x is None else round(x, 2)
+        return {"n": self.n, "mean": r(self.mean()), "max": r(self.max()),
+                "ewma": r(self.ewma), "slope_h": r(self.slope())}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "ref": self.ref, "ewma": self.ewma,
+                "samples": [list(x) for x in self.samples], "maxq": [list(x) for x in self.maxq]}
+
 def _save_state(path: Path, state):
-    path.write_text(json.dumps(state), encoding="utf-8")
+    persist.write_text(path, json.dumps(state))
 
 def _level(speed, gust, watch_wind, storm_wind):
     m = speed if gust is None else max(speed, gust)
@@ -68,41 +185,123 @@ def _extract_wind(owm: Dict[str, Any]) -> Tuple[float, Optional[float], str]:
     location = owm.get("name", "N/A")
     return speed, gust, location
 
-def tick(cfg: Dict[str, Any], owm: Dict[str, Any]) -> Dict[str, Any]:
+def _rolls(d: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, RollingStats]:
+    """Rollfenster für Mittelwind (speed) und Spitze (max(speed, gust)) aus dem Zustand."""
+    stats = state.get("stats", {})
+    return {k: RollingStats(d["window"], d["tau_min"], stats.get(k)) for k in ("speed", "peak")}
+
+
+def _step(d: Dict[str, Any], roll: Dict[str, RollingStats], speed: float, gust: Optional[float],
+          t: float, prev: str = "OK") -> Dict[str, Any]:
+    """
+    Ein Automatenschritt ohne I/O – tick() und --replay nutzen dieselbe Logik.
+    Aktualisiert die Rollfenster und bestimmt die neue Stufe.
+    """
+    peak = speed if gust is None else max(speed, gust)
+
+    # Wiederverwendete OWM-Daten (gleiches dt) nicht doppelt zählen
+    if roll["peak"].last_t is None or t > roll["peak"].last_t:
+        roll["speed"].push(t, speed)
+        roll["peak"].push(t, peak)
+
+    p = roll["peak"]
+    if d["basis"] == "mean":
+        sustained = p.mean()
+    elif d["basis"] == "ewma":
+        sustained = p.ewma
+    else:
+        sustained = peak
+    new = _level(sustained, None, d["watch_wind"], d["storm_wind"])
+    reason = d["basis"]
+    order = ("OK", "WATCH", "STORM")
+    if order.index(new) < order.index(prev):
+        h = d["hysteresis"]
+        held = _level(sustained, None, d["watch_wind"] - h, d["storm_wind"] - h)
+        if order.index(held) > order.index(new):
+            new, reason = held, "hysteresis"
+
+    slope = p.slope()
+    projected = None
+    if slope is not None and slope >= d["trend_rise"]:
+        projected = sustained + slope * d["trend_horizon_h"]
+        if new == "OK" and projected >= d["storm_wind"]:
+            new, reason = "WATCH", "trend"   # nur vorwarnen – STORM erst bei echtem Wind
+
+    return {
+        "level": new,
+        "reason": reason,
+        "sustained": round(sustained, 2),
+        "projected": None if projected is None else round(projected, 2),
+        "stats": {k: r.summary() for k, r in roll.items()},
+    }
+
+
+def tick(cfg: Dict[str, Any], owm: Dict[str, Any], deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     """
     Pure: nimmt OWM-Daten und gibt nur das Stormwarning-Resultat zurück.
+    deadline begrenzt nur den SMTP-Timeout – die Warnmail selbst wird nie abgeworfen.
+    Die Stufe folgt standardmäßig dem geglätteten Wind (Rollfenster im Zustand),
+    damit einzelne Böen keine Mail auslösen; steigender Wind führt vorab zu WATCH.
+    Ohne Winddaten (OWM-Fehler) bleiben Rollfenster und Stufe unverändert.
     """
     d = _get_defaults(cfg)
     speed, gust, location = _extract_wind(owm)
 
     state = _load_state(d["state_file"])
     prev = state.get("state", "OK")
-    new = _level(speed, gust, d["watch_wind"], d["storm_wind"])
+    now = time.time()
+    roll = _rolls(d, state)
+    if "error" in owm or (owm.get("wind") or {}).get("speed") is None:
+        # OWM-Fehler/kein Wind: nichts ins Rollfenster schieben (0 m/s würde den Mittelwert
+        # drücken und eine Entwarnung auslösen), Stufe unverändert lassen
+        step = {"level": prev, "reason": "no data", "sustained": None, "projected": None,
+                "stats": {k: r.summary() for k, r in roll.items()}}
+    else:
+        step = _step(d, roll, speed, gust, float(owm.get("dt") or now), prev)
+    state["stats"] = {k: r.to_dict() for k, r in roll.items()}
+    new = step["level"]
 
     mailed = False
+    mail_error = None
     if new != prev:
         gust_txt = "" if gust is None else f", Böe: {gust:.1f} {d['units']}"
+        slope = step["stats"]["peak"]["slope_h"]
+        trend_txt = "" if slope is None else f", Trend: {slope:+.1f} {d['units']}/h"
         subject = f"[Stormwarning] {location}: {new}"
         body = (
             f"Ort: {location}\n"
-            f"Zustand: {prev} → {new}\n"
+            f"Zustand: {prev} → {new} ({step['reason']})\n"
             f"Aktueller Wind: {speed:.1f} {d['units']}{gust_txt}\n"
+            f"Anhaltend ({d['basis']}): {step['sustained']:.1f} {d['units']}{trend_txt}\n"
             f"Schwellen: WATCH ≥ {d['watch_wind']:.1f} {d['units']}, "
             f"STORM ≥ {d['storm_wind']:.1f} {d['units']}\n"
         )
-        _send_mail(cfg, subject, body)
-        mailed = True
+        try:
+            _send_mail(cfg, subject, body, timeout=deadline.timeout(30, floor=5) if deadline else 30)
+            mailed = True
+        except Exception as e:
+            # SMTP weg/Timeout: JSON trotzdem schreiben, Fehler im Ergebnis vermerken; die alte
+            # Stufe bleibt gespeichert, damit der nächste Lauf den Wechsel erneut meldet
+            mail_error = f"{type(e).__name__}: {e}"
+            print(f"⚠️ [Stormwarning] Mail fehlgeschlagen: {mail_error}")
+            if deadline is not None:
+                deadline.degrade("mail", type(e).__name__)
 
-    state["state"] = new
-    state["last_update"] = time.time()
+    state["state"] = prev if mail_error else new
+    state["last_update"] = now
     _save_state(d["state_file"], state)
 
     result = {
         "prev_state": prev,
         "new_state": new,
         "mailed": mailed,
+        "mail_error": mail_error,
+        "reason": step["reason"],
         "wind_speed": speed,
         "wind_gust": gust,
+        "wind_sustained": step["sustained"],
+        "wind_projected": step["projected"],
+        "wind_stats": step["stats"],
         "location": location,
         "state_file": str(d["state_file"]),
     }
@@ -111,13 +310,91 @@ def tick(cfg: Dict[str, Any], owm: Dict[str, Any]) -> Dict[str, Any]:
     print(f"[Stormwarning] {location}: {prev} → {new} (Mail: {mailed})")
     return result
 
-# CLI (nur Testmail)
+# ============================ Replay archivierter JSONs ============================
+
+def _load_archive(paths: List[Path]) -> List[Tuple[float, float, Optional[float]]]:
+    """(t, speed, gust) aus archivierten Ergebnis-JSONs (Schlüssel "openweathermap"), zeitlich sortiert."""
+    files: List[Path] = []
+    for p in paths:
+        files.extend(sorted(p.glob("*.json")) if p.is_dir() else [p])
+    out = []
+    for f in files:
+        try:
+            owm = json.loads(f.read_text(encoding="utf-8")).get("openweathermap") or {}
+        except Exception:
+            continue
+        if "wind" not in owm or not owm.get("dt"):
+            continue
+        speed, gust, _ = _extract_wind(owm)
+        out.append((float(owm["dt"]), speed, gust))
+    out.sort(key=lambda x: x[0])
+    return out
+
+
+def _synthetic_year(interval_min: float = 10.0) -> List[Tuple[float, float, Optional[float]]]:
+    """Ein Jahr Wind mit Tagesgang, Rauschen, einzelnen Böen und einigen Sturmlagen."""
+    import random
+    rnd = random.Random(1)
+    out = []
+    t0 = 1_700_000_000.0
+    for i in range(int(365 * 24 * 60 / interval_min)):
+        t = t0 + i * interval_min * 60
+        day = math.sin(2 * math.pi * (t % 86400) / 86400)
+        storm = 14.0 * max(0.0, math.sin(2 * math.pi * i / 4000)) ** 8
+        speed = max(0.0, 4 + 2 * day + storm + rnd.gauss(0, 1))
+        gust = speed * 1.4 + (12 if rnd.random() < 0.01 else 0)
+        out.append((t, speed, gust))
+    return out
+
+
+def replay(cfg: Dict[str, Any], samples: List[Tuple[float, float, Optional[float]]]) -> Dict[str, Any]:
+    """
+    Spielt Stichproben durch den Automaten (ohne Mail, ohne Zustandsdatei) – einmal mit der
+    konfigurierten Grundlage und zum Vergleich mit "instant". Zählt Zustandswechsel.
+    """
+    d = _get_defaults(cfg)
+    out: Dict[str, Any] = {"samples": len(samples)}
+    for basis in dict.fromkeys([d["basis"], "instant"]):
+        db = dict(d, basis=basis)
+        roll = _rolls(db, {})
+        state = "OK"
+        changes: Dict[str, int] = {}
+        t0 = time.perf_counter()
+        for t, speed, gust in samples:
+            new = _step(db, roll, speed, gust, t, state)["level"]
+            if new != state:
+                k = f"{state}→{new}"
+                changes[k] = changes.get(k, 0) + 1
+                state = new
+        out[basis] = {"transitions": sum(changes.values()), "by_kind": changes,
+                      "seconds": round(time.perf_counter() - t0, 3)}
+    return out
+
+
+# CLI (Testmail / Replay)
 if __name__ == "__main__":
+    import argparse
+
     parser = argparse.ArgumentParser(description="Stormwarning")
     parser.add_argument("--sendtestmail", action="store_true", help="Nur eine Test-Mail verschicken")
+    parser.add_argument("--replay", type=Path, nargs="*", metavar="PFAD",
+                        help="Archivierte JSONs (Dateien/Verzeichnisse) durch den Automaten spielen; "
+                             "ohne Pfad: ein synthetisches Jahr")
     args = parser.parse_args()
 
     cfg_path = Path(__file__).resolve().parent.parent / "config.local.json"
+    if args.replay is not None:
+        cfg = json.loads(cfg_path.read_text(encoding="utf-8")) if cfg_path.exists() else {}
+        t0 = time.perf_counter()
+        samples = _load_archive(args.replay) if args.replay else _synthetic_year()
+        loaded = time.perf_counter() - t0
+        r = replay(cfg, samples)
+        print(f"{r['samples']} Stichproben geladen in {loaded:.2f} s")
+        for basis, v in r.items():
+            if basis != "samples":
+                print(f"  {basis:>7}: {v['transitions']:>4} Wechsel {v['by_kind']} in {v['seconds']:.3f} s")
+        raise SystemExit(0)
+
     if not cfg_path.exists():
         raise FileNotFoundError(f"Config-Datei nicht gefunden: {cfg_path}")
     cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
@@ -1,10 +1,13 @@
 import os
-import subprocess
 from pathlib import Path
 
-def upload(cfg: dict, target_path: Path):
+from modules.deadline import run_group
+
+def upload(cfg: dict, target_path: Path, timeout: float | None = None):
     """
     Führt den Upload via 03_upload.sh (liegt im modules/ Ordner) aus.
+    timeout: harte Obergrenze für sshpass/sftp (subprocess.TimeoutExpired bei Überschreitung;
+    Skript samt Kindprozessen wird beendet).
     """
     # Korrekt: Skript liegt in modules/
     script_path = Path(__file__).parent / "03_upload_picture.sh"
@@ -13,13 +16,15 @@ def upload(cfg: dict, target_path: Path):
     env["REMOTE_USER"] = cfg["remote_user"]
     env["REMOTE_HOST"] = cfg["remote_host"]
     env["PASSWORD"]    = cfg["password"]
+    env["CONNECT_TIMEOUT"] = str(int(cfg.get("connect_timeout", 10)))
 
-    subprocess.run(
+    run_group(
         [str(script_path),
          cfg["remote_path"],
          cfg["remote_file"],
          str(target_path)],
         check=True,
-        env=env
+        env=env,
+        timeout=timeout
     )
     print(f"✅ Upload erfolgreich: {target_path} -> {cfg['remote_path']}{cfg['remote_file']}")